@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the throughput of hash_passwords and verify_many over a
+range of worker counts.
+
+Usage: ./bench_hashing.py [-n PASSWORDS] [-r ROUNDS] [-w WORKERS ...]
+"""
+
+
+import argparse
+import os
+import time
+from typing import Callable, List
+
+from encrypt_password import hash_passwords, verify_many
+
+
+def default_workers() -> List[int]:
+    """
+    Returns powers of two up to twice the number of CPUs.
+
+    Returns:
+        List[int]: The worker counts to benchmark.
+    """
+    limit = 2 * (os.cpu_count() or 1)
+    workers = [1]
+    while workers[-1] * 2 <= limit:
+        workers.append(workers[-1] * 2)
+    return workers
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    Parses the command line arguments.
+
+    Returns:
+        argparse.Namespace: The benchmark parameters.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark parallel bcrypt hashing and verification")
+    parser.add_argument("-n", "--passwords", type=int, default=64,
+                        help="passwords hashed and verified per run")
+    parser.add_argument("-r", "--rounds", type=int, default=10,
+                        help="bcrypt work factor")
+    parser.add_argument("-w", "--workers", type=int, nargs="+",
+                        default=default_workers(),
+                        help="worker counts to compare")
+    return parser.parse_args()
+
+
+def timed(fn: Callable[[], list]) -> float:
+    """
+    Times a call consuming a whole result iterator.
+
+    Args:
+        fn (Callable[[], list]): The call to time.
+
+    Returns:
+        float: The elapsed time in seconds.
+    """
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    """
+    Runs the benchmark and prints one line per worker count.
+    """
+    args = parse_args()
+    passwords = ["password {}".format(i) for i in range(args.passwords)]
+    hashes = list(hash_passwords(passwords, workers=1, rounds=args.rounds))
+    pairs = list(zip(hashes, passwords))
+
+    print("{} passwords, {} rounds, {} CPUs".format(
+        args.passwords, args.rounds, os.cpu_count()))
+    print("{:>7} {:>10} {:>10} {:>8}".format(
+        "workers", "hash/s", "verify/s", "speedup"))
+    baseline = None
+    for workers in args.workers:
+        hash_time = timed(lambda: list(hash_passwords(
+            passwords, workers=workers, rounds=args.rounds)))
+        verify_time = timed(lambda: list(verify_many(pairs,
+                                                     workers=workers)))
+        if baseline is None:
+            baseline = hash_time + verify_time
+        print("{:>7} {:>10.1f} {:>10.1f} {:>7.2f}x".format(
+            workers, args.passwords / hash_time,
+            args.passwords / verify_time,
+            baseline / (hash_time + verify_time)))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,21 +5,32 @@ and validating password hashes.
 """
 
 
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
 import bcrypt
 
 
-def hash_password(password: str) -> bytes:
+# Work factor of new hashes; bcrypt's own default is 12
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hashes a password with a salt using bcrypt.
 
     Args:
         password (str): The plain text password to be hashed.
+        rounds (int): The bcrypt work factor (default: BCRYPT_ROUNDS).
 
     Returns:
         bytes: The salted, hashed password as a byte string.
     """
     # Generate a salt and hash the password
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password
 
@@ -37,3 +48,164 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         False otherwise.
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def get_rounds(hashed_password: bytes) -> int:
+    """
+    Reads the work factor of a bcrypt hash.
+
+    Args:
+        hashed_password (bytes): A hash like b"$2b$12$...".
+
+    Returns:
+        int: The work factor the hash was computed with.
+    """
+    return int(hashed_password.split(b'$')[2])
+
+
+def needs_rehash(hashed_password: bytes, rounds: int = None) -> bool:
+    """
+    Checks whether a hash was computed below the target work factor.
+
+    Args:
+        hashed_password (bytes): The previously hashed password.
+        rounds (int): The target work factor (default: BCRYPT_ROUNDS).
+
+    Returns:
+        bool: True if the hash should be recomputed.
+    """
+    return get_rounds(hashed_password) < (rounds or BCRYPT_ROUNDS)
+
+
+def verify_and_update(hashed_password: bytes, password: str,
+                      rounds: int = None) -> Tuple[bool, Optional[bytes]]:
+    """
+    Validates a password and, if it matches a hash below the target work
+    factor, rehashes it at that work factor.
+
+    Args:
+        hashed_password (bytes): The previously hashed password.
+        password (str): The plain text password to verify.
+        rounds (int): The target work factor (default: BCRYPT_ROUNDS).
+
+    Returns:
+        Tuple[bool, Optional[bytes]]: Whether the password matches, and
+        the new hash to store, or None if the stored one is up to date.
+    """
+    if not is_valid(hashed_password, password):
+        return False, None
+    if needs_rehash(hashed_password, rounds):
+        return True, hash_password(password, rounds)
+    return True, None
+
+
+def calibrate_rounds(target_seconds: float = 0.25, min_rounds: int = 4,
+                     max_rounds: int = 16) -> int:
+    """
+    Picks the highest work factor whose verification takes at most
+    `target_seconds` on this host.
+
+    Each extra round doubles the cost, so factors are timed from
+    `min_rounds` upwards until one exceeds the target.
+
+    Args:
+        target_seconds (float): The acceptable verification latency.
+        min_rounds (int): The lowest work factor returned.
+        max_rounds (int): The highest work factor tried.
+
+    Returns:
+        int: The calibrated work factor.
+    """
+    password = b"calibration password"
+    best = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+        start = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        if time.perf_counter() - start > target_seconds:
+            break
+        best = rounds
+    return best
+
+
+def _hash_pair(pair: Tuple[str, int]) -> bytes:
+    """
+    Hashes a (password, rounds) pair.
+    """
+    return hash_password(*pair)
+
+
+def _verify_pair(pair: Tuple[bytes, str]) -> bool:
+    """
+    Validates a (hashed_password, password) pair.
+    """
+    return is_valid(*pair)
+
+
+def _ordered_map(fn: Callable, items: Iterable, workers: int) -> Iterator:
+    """
+    Applies `fn` to items across worker processes, yielding results in
+    input order as they become available.
+
+    At most two items per worker are in flight, so the input is consumed
+    lazily and memory stays bounded.
+
+    Args:
+        fn (Callable): A module-level (picklable) function.
+        items (Iterable): The arguments, one per call.
+        workers (int): The number of worker processes; 1 or less runs
+            everything in the calling process.
+
+    Yields:
+        The result of each call.
+    """
+    if workers <= 1:
+        for item in items:
+            yield fn(item)
+        return
+    pending = deque()
+    with ProcessPoolExecutor(workers) as executor:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def hash_passwords(passwords: Iterable[str], workers: int = None,
+                   rounds: int = None) -> Iterator[bytes]:
+    """
+    Hashes many passwords in parallel.
+
+    Args:
+        passwords (Iterable[str]): The plain text passwords.
+        workers (int): The number of worker processes (default: the
+            number of CPUs).
+        rounds (int): The bcrypt work factor (default: BCRYPT_ROUNDS).
+
+    Yields:
+        bytes: The hash of each password, in input order.
+    """
+    rounds = rounds or BCRYPT_ROUNDS
+    workers = workers or os.cpu_count() or 1
+    pairs = ((password, rounds) for password in passwords)
+    return _ordered_map(_hash_pair, pairs, workers)
+
+
+def verify_many(pairs: Iterable[Tuple[bytes, str]],
+                workers: int = None) -> Iterator[bool]:
+    """
+    Validates many passwords against their hashes in parallel.
+
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): (hashed_password, password)
+            pairs, in the argument order of `is_valid`.
+        workers (int): The number of worker processes (default: the
+            number of CPUs).
+
+    Yields:
+        bool: Whether each password matches its hash, in input order.
+    """
+    workers = workers or os.cpu_count() or 1
+    return _ordered_map(_verify_pair, pairs, workers)
@@ -5,10 +5,20 @@ field redaction, as well as database connection setup.
 """
 
 
+import argparse
+import json
 import logging
+import logging.handlers
+import queue
 import re
 import os
-from typing import List, Tuple
+import resource
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterator, List, Mapping, Sequence, Tuple
 import mysql.connector
 
 
@@ -30,13 +40,75 @@ def filter_datum(fields: List[str], redaction: str,
     Returns:
         str: The log message with sensitive fields obfuscated.
     """
-    pattern = f"({'|'.join(fields)})=([^ {separator}]+)"
-    return re.sub(pattern, lambda m: f"{m.group(1)}={redaction}", message)
+    return get_redactor(tuple(fields), redaction, separator).redact(message)
+
+
+class Redactor:
+    """
+    Obfuscates field values in log messages with a pattern compiled once
+    for a given set of fields and separator.
+
+    Instead of calling back into Python for every match, the message is
+    split on the pattern in a single pass and reassembled with each value
+    replaced by the redaction string.
+    """
+
+    def __init__(self, fields: Sequence[str], redaction: str,
+                 separator: str):
+        """
+        Compiles the redaction pattern.
+
+        Args:
+            fields (Sequence[str]): The fields to obfuscate.
+            redaction (str): The string used to replace field values.
+            separator (str): The character separating fields.
+        """
+        self.pattern = re.compile(f"({'|'.join(fields)})=([^ {separator}]+)")
+        self.redaction = redaction
+
+    def redact(self, message: str) -> str:
+        """
+        Obfuscates the configured fields in a log message.
+
+        Args:
+            message (str): The log line containing the data.
+
+        Returns:
+            str: The log message with sensitive fields obfuscated.
+        """
+        if self.pattern.groups != 2:
+            # Fields containing groups would shift the split layout
+            return self.pattern.sub(
+                lambda m: f"{m.group(1)}={self.redaction}", message)
+        # split() yields [text, field, value, text, field, value, ..., text]
+        parts = self.pattern.split(message)
+        matches = len(parts) // 3
+        if matches == 0:
+            return message
+        suffix = "=" + self.redaction
+        parts[1::3] = [field + suffix for field in parts[1::3]]
+        parts[2::3] = [""] * matches
+        return "".join(parts)
+
+
+@lru_cache(maxsize=64)
+def get_redactor(fields: Tuple[str, ...], redaction: str,
+                 separator: str) -> Redactor:
+    """
+    Returns the cached Redactor for a set of fields, redaction string and
+    separator.
+    """
+    return Redactor(fields, redaction, separator)
 
 
 class RedactingFormatter(logging.Formatter):
     """ Redacting Formatter class to filter sensitive information
-    in log records. """
+    in log records.
+
+    A record carrying a mapping in its `data` attribute (passed with
+    `extra={"data": row}`) is redacted by key and rendered as a
+    "key=value; key=value" message, whatever its values contain; other
+    records have their message redacted with the field pattern. """
 
     REDACTION = "***"
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
@@ -52,6 +124,22 @@ class RedactingFormatter(logging.Formatter):
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.field_set = frozenset(fields)
+        self.redactor = get_redactor(tuple(fields), self.REDACTION,
+                                     self.SEPARATOR)
+
+    def redact_data(self, data: Mapping) -> dict:
+        """
+        Replaces the values of the redacted fields in a mapping.
+
+        Args:
+            data (Mapping): The structured log data.
+
+        Returns:
+            dict: A copy of the data with sensitive values obfuscated.
+        """
+        return {key: self.REDACTION if key in self.field_set else value
+                for key, value in data.items()}
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -63,17 +151,164 @@ class RedactingFormatter(logging.Formatter):
         Returns:
             str: The formatted and redacted log message.
         """
-        record.msg = (
-          filter_datum(self.fields, self.REDACTION, record.msg, self.SEPARATOR)
-        )
+        data = getattr(record, "data", None)
+        if isinstance(data, Mapping):
+            record.msg = f"{self.SEPARATOR} ".join(
+                f"{key}={value}"
+                for key, value in self.redact_data(data).items()
+            )
+            record.args = None
+        else:
+            record.msg = self.redactor.redact(record.msg)
         return super().format(record)
 
 
-def get_logger() -> logging.Logger:
+class JSONRedactingFormatter(RedactingFormatter):
+    """ Redacting Formatter rendering each record as one JSON object per
+    line, with structured data kept as a nested object. """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Formats the log record as a JSON line, applying redaction to
+        specified fields.
+
+        Args:
+            record (logging.LogRecord): The log record to be formatted.
+
+        Returns:
+            str: The formatted and redacted JSON line.
+        """
+        entry = {
+            "name": record.name,
+            "level": record.levelname,
+            "time": self.formatTime(record),
+        }
+        data = getattr(record, "data", None)
+        if isinstance(data, Mapping):
+            entry["data"] = self.redact_data(data)
+        else:
+            record.msg = self.redactor.redact(record.msg)
+            entry["message"] = record.getMessage()
+        return json.dumps(entry, default=str)
+
+
+class _BlockingStopListener(logging.handlers.QueueListener):
+    """ Queue listener whose stop sentinel waits for room in a full queue
+    instead of raising queue.Full. """
+
+    def enqueue_sentinel(self):
+        """
+        Puts the stop sentinel on the queue, waiting for room if needed.
+        """
+        self.queue.put(self._sentinel)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """ Handler that hands records over to a background listener thread
+    through a bounded queue.
+
+    Redaction, formatting and I/O all happen on the listener thread. When
+    the queue is full, the overflow policy decides what happens:
+    "block" waits for room, "drop-newest" discards the incoming record and
+    "drop-oldest" discards the oldest queued one. Discarded records are
+    counted in `dropped`.
+    """
+
+    OVERFLOW_POLICIES = ("block", "drop-newest", "drop-oldest")
+
+    def __init__(self, target: logging.Handler, queue_size: int = 10000,
+                 overflow: str = "block"):
+        """
+        Initializes the queue and starts the listener thread.
+
+        Args:
+            target (logging.Handler): The handler the listener feeds.
+            queue_size (int): The maximum number of queued records.
+            overflow (str): One of OVERFLOW_POLICIES.
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        super().__init__(queue.Queue(queue_size))
+        self.overflow = overflow
+        self.enqueued = 0
+        self.dropped = 0
+        self.listener = _BlockingStopListener(self.queue, target,
+                                              respect_handler_level=True)
+        self.listener.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Passes the record through untouched, leaving formatting and
+        redaction to the listener thread.
+        """
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        """
+        Queues a record according to the overflow policy. Called with the
+        handler lock held, which keeps the counters consistent.
+        """
+        if self.overflow == "block":
+            self.queue.put(record)
+        elif self.overflow == "drop-newest":
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+                return
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(record)
+                    break
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.queue.task_done()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+        self.enqueued += 1
+
+    def flush(self):
+        """
+        Waits until every queued record has been handled, then flushes
+        the target handlers.
+        """
+        if self.listener is None or self.listener._thread is None:
+            return
+        self.queue.join()
+        for handler in self.listener.handlers:
+            handler.flush()
+
+    def close(self):
+        """
+        Drains the queue and stops the listener thread. Also run by
+        logging.shutdown() at interpreter exit.
+        """
+        if self.listener is not None and self.listener._thread is not None:
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.flush()
+        super().close()
+
+
+def get_logger(asynchronous: bool = False, queue_size: int = 10000,
+               overflow: str = "block",
+               json_lines: bool = False) -> logging.Logger:
     """
     Creates and configures a logger for user data with sensitive information
     redaction.
 
+    Args:
+        asynchronous (bool): Whether to redact and write records on a
+            background thread fed through a BoundedQueueHandler.
+        queue_size (int): The maximum number of queued records.
+        overflow (str): The queue overflow policy: "block",
+            "drop-newest" or "drop-oldest".
+        json_lines (bool): Whether to write JSON lines instead of the
+            [HOLBERTON] text format.
+
     Returns:
         logging.Logger: Configured logger instance.
     """
@@ -81,10 +316,16 @@ def get_logger() -> logging.Logger:
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
+    formatter_class = JSONRedactingFormatter if json_lines \
+        else RedactingFormatter
     stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(RedactingFormatter(fields=PII_FIELDS))
+    stream_handler.setFormatter(formatter_class(fields=PII_FIELDS))
 
-    logger.addHandler(stream_handler)
+    if asynchronous:
+        logger.addHandler(BoundedQueueHandler(stream_handler, queue_size,
+                                              overflow))
+    else:
+        logger.addHandler(stream_handler)
     return logger
 
 
@@ -109,31 +350,187 @@ def get_db() -> mysql.connector.connection.MySQLConnection:
     )
 
 
-def main():
+def iter_batches(cursor, batch_size: int) -> Iterator[Sequence[tuple]]:
+    """
+    Yields the rows of an executed query in batches.
+
+    Args:
+        cursor: An unbuffered cursor on which a query has been executed.
+        batch_size (int): The number of rows fetched at a time.
+
+    Yields:
+        Sequence[tuple]: The next batch of rows.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+
+def peak_rss_kb() -> int:
+    """
+    Returns the peak resident set size of the process in kilobytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak //= 1024
+    return peak
+
+
+def format_batch(columns: Sequence[str], rows: Sequence[tuple],
+                 json_lines: bool = False) -> List[str]:
+    """
+    Formats and redacts a batch of rows the way the user_data logger
+    would, for use in worker processes.
+
+    Args:
+        columns (Sequence[str]): The column names.
+        rows (Sequence[tuple]): The rows to format.
+        json_lines (bool): Whether to format JSON lines.
+
+    Returns:
+        List[str]: One formatted, redacted line per row.
+    """
+    formatter_class = JSONRedactingFormatter if json_lines \
+        else RedactingFormatter
+    formatter = formatter_class(fields=PII_FIELDS)
+    lines = []
+    for row in rows:
+        record = logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                                   "", None, None)
+        record.data = dict(zip(columns, row))
+        lines.append(formatter.format(record))
+    return lines
+
+
+def log_rows(cursor, columns: Sequence[str], batch_size: int,
+             json_lines: bool = False) -> int:
+    """
+    Logs the rows of an executed query through the user_data logger, each
+    passed as structured data so it is redacted by column name.
+
+    Returns:
+        int: The number of rows logged.
+    """
+    logger = get_logger(json_lines=json_lines)
+    count = 0
+    for rows in iter_batches(cursor, batch_size):
+        for row in rows:
+            logger.info("", extra={"data": dict(zip(columns, row))})
+        count += len(rows)
+    return count
+
+
+def log_rows_parallel(cursor, columns: Sequence[str], batch_size: int,
+                      workers: int, stream=None,
+                      json_lines: bool = False) -> int:
+    """
+    Formats and redacts the rows of an executed query in worker
+    processes, writing the lines in the original row order.
+
+    At most two batches per worker are in flight, so memory stays
+    bounded however many rows the query returns.
+
+    Args:
+        cursor: An unbuffered cursor on which a query has been executed.
+        columns (Sequence[str]): The column names.
+        batch_size (int): The number of rows per batch.
+        workers (int): The number of worker processes.
+        stream: Where lines are written (default: sys.stderr, like the
+            user_data logger).
+        json_lines (bool): Whether to write JSON lines.
+
+    Returns:
+        int: The number of rows logged.
+    """
+    stream = stream if stream is not None else sys.stderr
+    count = 0
+    pending = deque()
+
+    def write_next():
+        lines = pending.popleft().result()
+        if lines:
+            stream.write("\n".join(lines) + "\n")
+        return len(lines)
+
+    with ProcessPoolExecutor(workers) as executor:
+        for rows in iter_batches(cursor, batch_size):
+            pending.append(executor.submit(format_batch, columns, rows,
+                                           json_lines))
+            if len(pending) >= 2 * workers:
+                count += write_next()
+        while pending:
+            count += write_next()
+    stream.flush()
+    return count
+
+
+def main(batch_size: int = None, workers: int = None,
+         json_lines: bool = False):
     """
     Main function that retrieves and logs user data from the database, with
     sensitive information redacted.
+
+    Rows are streamed from an unbuffered cursor in batches of `batch_size`
+    (default: PERSONAL_DATA_BATCH_SIZE, or 1000) and logged as they
+    arrive, so memory use doesn't depend on the size of the table. With
+    more than one worker (default: PERSONAL_DATA_WORKERS, or 1), batches
+    are redacted in parallel worker processes. The throughput and peak
+    memory are reported on stderr at the end.
+
+    Args:
+        batch_size (int): The number of rows fetched at a time.
+        workers (int): The number of redaction worker processes.
+        json_lines (bool): Whether to write JSON lines instead of the
+            [HOLBERTON] text format.
     """
+    if batch_size is None:
+        batch_size = int(os.getenv("PERSONAL_DATA_BATCH_SIZE", "1000"))
+    if workers is None:
+        workers = int(os.getenv("PERSONAL_DATA_WORKERS", "1"))
+    start = time.perf_counter()
     db = get_db()
-    cursor = db.cursor()
+    cursor = db.cursor(buffered=False)
 
-    # Retrieve all rows in the users table
+    # Stream the rows of the users table
     cursor.execute("SELECT * FROM users;")
-    rows = cursor.fetchall()
 
     # Get column names to properly format each row
     columns = [column[0] for column in cursor.description]
 
-    logger = get_logger()
-
     # Format each row as a message with redacted fields
-    for row in rows:
-        row_data = "; ".join(f"{col}={val}" for col, val in zip(columns, row))
-        logger.info(row_data)
+    if workers > 1:
+        count = log_rows_parallel(cursor, columns, batch_size, workers,
+                                  json_lines=json_lines)
+    else:
+        count = log_rows(cursor, columns, batch_size, json_lines)
 
     cursor.close()
     db.close()
 
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"{count} rows in {elapsed:.2f}s ({rate:.0f} rows/s), "
+          f"peak RSS {peak_rss_kb()} kB", file=sys.stderr)
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """
+    Parses the command line options of the export.
+    """
+    parser = argparse.ArgumentParser(
+        description="Log the users table with PII fields redacted.")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of redaction worker processes")
+    parser.add_argument("-b", "--batch-size", type=int, default=None,
+                        help="number of rows fetched per batch")
+    parser.add_argument("--json", action="store_true", dest="json_lines",
+                        help="write JSON lines instead of text")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    main(batch_size=args.batch_size, workers=args.workers,
+         json_lines=args.json_lines)
@@ -15,6 +15,13 @@ app = Flask(__name__)
 app.register_blueprint(app_views)
 CORS(app, resources={r"/api/v1/*": {"origins": "*"}})
 
+# Paths that never require authentication
+EXCLUDED_PATHS = (
+    '/api/v1/status/',
+    '/api/v1/unauthorized/',
+    '/api/v1/forbidden/',
+)
+
 # Initialize authentication
 auth = None
 auth_type = getenv('AUTH_TYPE', 'auth')
@@ -48,12 +55,7 @@ def forbidden(error) -> str:
 def authenticate_user():
     """Authenticates a user before processing a request."""
     if auth:
-        excluded_paths = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/',
-        ]
-        if auth.require_auth(request.path, excluded_paths):
+        if auth.require_auth(request.path, EXCLUDED_PATHS):
             auth_header = auth.authorization_header(request)
             if auth_header is None:
                 abort(401)  # Unauthorized
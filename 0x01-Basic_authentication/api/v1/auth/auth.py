@@ -3,10 +3,37 @@
 
 
 import re
-from typing import List, TypeVar
+from functools import lru_cache
+from typing import List, Pattern, Tuple, TypeVar
 from flask import request
 
 
+@lru_cache(maxsize=32)
+def compile_excluded_paths(excluded_paths: Tuple[str, ...]) -> Pattern:
+    """Compiles exclusion paths into a single matcher.
+
+    Each path becomes one alternative of a combined regular expression,
+    so matching a request path costs one `match` call whatever the
+    number of exclusions. Results are cached per distinct tuple.
+
+    Args:
+        excluded_paths: The exclusion paths, as given to `require_auth`.
+
+    Returns:
+        The compiled pattern.
+    """
+    alternatives = []
+    for exclusion_path in map(lambda x: x.strip(), excluded_paths):
+        if exclusion_path.endswith('*'):
+            pattern = f'{exclusion_path[:-1]}.*'
+        elif exclusion_path.endswith('/'):
+            pattern = f'{exclusion_path[:-1]}/.*'
+        else:
+            pattern = f'{exclusion_path}/.*'
+        alternatives.append(f'(?:{pattern})')
+    return re.compile('|'.join(alternatives))
+
+
 class Auth:
     """Base authentication class for the API.
 
@@ -31,18 +58,10 @@ class Auth:
             True if the path requires authentication, False otherwise.
         """
         if path and excluded_paths:
-            for exclusion_path in map(lambda x: x.strip(), excluded_paths):
-                # Build a regular expression pattern from the exclusion path
-                if exclusion_path.endswith('*'):
-                    pattern = f'{exclusion_path[:-1]}.*'
-                elif exclusion_path.endswith('/'):
-                    pattern = f'{exclusion_path[:-1]}/.*'
-                else:
-                    pattern = f'{exclusion_path}/.*'
-
-                # Check if the path matches the pattern
-                if re.match(pattern, path):
-                    return False  # Path is excluded
+            if not isinstance(excluded_paths, tuple):
+                excluded_paths = tuple(excluded_paths)
+            if compile_excluded_paths(excluded_paths).match(path):
+                return False  # Path is excluded
         return True  # Path requires authentication
 
     def authorization_header(self, request=None) -> str:
@@ -5,14 +5,28 @@
 import re
 import base64
 import binascii
+from os import getenv
 from typing import Tuple, TypeVar
 
 from .auth import Auth
+from .credential_cache import CredentialCache
 from models.user import User
 
 
 class BasicAuth(Auth):
-    """Handles Basic Authentication for the API."""
+    """Handles Basic Authentication for the API.
+
+    Verified Authorization headers are remembered in a CredentialCache
+    sized by BASIC_AUTH_CACHE_SIZE (0 disables it) whose entries expire
+    after BASIC_AUTH_CACHE_TTL seconds.
+    """
+
+    def __init__(self):
+        """Initializes the verified-credential cache."""
+        self.credential_cache = CredentialCache(
+            max_size=int(getenv('BASIC_AUTH_CACHE_SIZE', '1024')),
+            ttl=float(getenv('BASIC_AUTH_CACHE_TTL', '300')),
+        )
 
     def _extract_base64_token(self, authorization_header: str) -> str:
         """Extracts the Base64 token from the Authorization header.
@@ -94,7 +108,40 @@ class BasicAuth(Auth):
             The User object if authenticated, otherwise None.
         """
         auth_header = self.authorization_header(request)
+        if not isinstance(auth_header, str):
+            return None
+        user = self._cached_user(auth_header)
+        if user is not None:
+            return user
         base64_token = self._extract_base64_token(auth_header)
         decoded_token = self._decode_base64_token(base64_token)
         email, password = self._extract_credentials(decoded_token)
-        return self._find_user(email, password)
+        user = self._find_user(email, password)
+        if user is not None:
+            self.credential_cache.put(auth_header, user.id,
+                                      user.email, user.password)
+        return user
+
+    def _cached_user(self, authorization_header: str) -> TypeVar('User'):
+        """Retrieves the user a header was already verified for.
+
+        The entry only stands while the stored user keeps the email and
+        password hash it was verified with, so saving a new password or
+        removing the user invalidates it.
+
+        Args:
+            authorization_header: The Authorization header from the request.
+
+        Returns:
+            The User object if the cached entry is still valid,
+            otherwise None.
+        """
+        def is_current(entry: Tuple[str, str, str]) -> bool:
+            user = User.get(entry[0])
+            return user is not None and user.email == entry[1] \
+                and user.password == entry[2]
+
+        entry = self.credential_cache.get(authorization_header, is_current)
+        if entry is None:
+            return None
+        return User.get(entry[0])
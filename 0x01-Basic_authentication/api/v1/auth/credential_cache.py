@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""Cache of already verified credentials for the API."""
+
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Tuple
+
+
+class CredentialCache:
+    """Bounded LRU cache with TTL mapping an Authorization header to the
+    user it was verified for.
+
+    Headers are never stored: entries are keyed by a keyed BLAKE2 digest
+    of the header, with a key generated for the process. Each entry keeps
+    the user's email and password hash as they were at verification time,
+    so a hit only stands while the stored user still holds them.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 300):
+        """Initializes an empty cache.
+
+        Args:
+            max_size: The maximum number of entries kept.
+            ttl: The number of seconds an entry stays valid.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._key = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, authorization_header: str) -> bytes:
+        """Computes the cache key of an Authorization header."""
+        return hashlib.blake2b(authorization_header.encode('utf-8'),
+                               key=self._key, digest_size=16).digest()
+
+    def get(self, authorization_header: str,
+            check: Callable[[Tuple[str, str, str]], bool] = None
+            ) -> Tuple[str, str, str]:
+        """Looks up a header.
+
+        Args:
+            authorization_header: The raw Authorization header.
+            check: An optional predicate; an entry it rejects is evicted
+                and counted as a miss.
+
+        Returns:
+            The (user id, email, password hash) tuple stored for the
+            header, or None if absent, expired or rejected.
+        """
+        key = self._digest(authorization_header)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] >= time.monotonic() \
+                    and (check is None or check(entry[1])):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, authorization_header: str, user_id: str,
+            email: str, password: str) -> None:
+        """Stores the user a header was verified for.
+
+        Args:
+            authorization_header: The raw Authorization header.
+            user_id: The ID of the authenticated user.
+            email: The email of the user at verification time.
+            password: The password hash of the user at verification time.
+        """
+        if self.max_size <= 0:
+            return
+        key = self._digest(authorization_header)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl,
+                                  (user_id, email, password))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, authorization_header: str) -> None:
+        """Removes the entry of a header, if any."""
+        key = self._digest(authorization_header)
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        """Returns the hit/miss counters and the current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+            }
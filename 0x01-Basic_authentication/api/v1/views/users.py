@@ -2,18 +2,151 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from flask import Response, abort, jsonify, request
 from models.user import User
+from os import getenv
+from typing import Callable, Iterator
+import binascii
+import json
+
+
+MAX_PAGE_SIZE = int(getenv('API_MAX_PAGE_SIZE', '100'))
+# Each created user costs one password hash (~0.1 s with the defaults)
+MAX_BATCH_SIZE = int(getenv('API_MAX_BATCH_SIZE', '100'))
+
+
+def encode_cursor(key: tuple) -> str:
+    """ Opaque cursor of a pagination key
+    """
+    if key is None:
+        return None
+    data = json.dumps(list(key), separators=(',', ':')).encode()
+    return urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """ Pagination key of a cursor, or None if the cursor is invalid
+    """
+    try:
+        data = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        key = json.loads(data)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(key, list) or len(key) != 2 \
+            or not all(isinstance(part, str) for part in key):
+        return None
+    return tuple(key)
+
+
+def requested_fields() -> list:
+    """ Attribute names of the `fields` query parameter, or None for all
+    """
+    fields = request.args.get('fields')
+    if fields is None:
+        return None
+    return [field for field in fields.split(',') if field]
+
+
+def not_modified(etag: str) -> Response:
+    """ 304 response if the client already has this version, else None
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def with_etag(response: Response, etag: str) -> Response:
+    """ Set the ETag of a response
+    """
+    response.set_etag(etag)
+    return response
+
+
+def stream_users(ndjson: bool, fields: list = None) -> Iterator[str]:
+    """ Serialize all users one page at a time
+
+    Users are walked in creation order through User.page(), so only one
+    page is held in memory and users created or removed meanwhile don't
+    break the iteration.
+    """
+    after = None
+    first = True
+    if not ndjson:
+        yield '['
+    while True:
+        users, after = User.page(MAX_PAGE_SIZE, after)
+        lines = [json.dumps(user.to_json(fields=fields), sort_keys=True)
+                 for user in users]
+        if ndjson:
+            yield ''.join(line + '\n' for line in lines)
+        elif lines:
+            yield ('' if first else ',') + ','.join(lines)
+            first = False
+        if after is None:
+            break
+    if not ndjson:
+        yield ']\n'
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: number of users per page (at most API_MAX_PAGE_SIZE)
+      - cursor: `next_cursor` of the previous page
+      - stream: `json` or `ndjson` to stream all users
+      - fields: comma-separated attributes to return for each user
     Return:
       - list of all User objects JSON represented
+      - with `limit` or `cursor`: a page of users ordered by creation date,
+        as {"users": [...], "next_cursor": cursor or null}
+      - with `stream=json`: the list of all users, sent in chunks
+      - with `stream=ndjson`: one User object JSON represented per line
+      - 304 if If-None-Match holds the ETag of the current users
+      - 400 if `limit`, `cursor` or `stream` is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    # Read before serializing: a change made meanwhile must change it
+    etag = User.collection_etag()
+    fields = requested_fields()
+    stream = request.args.get('stream')
+    if stream is not None:
+        if stream not in ('json', 'ndjson'):
+            return jsonify({'error': "stream must be json or ndjson"}), 400
+        mimetype = 'application/x-ndjson' if stream == 'ndjson' \
+            else 'application/json'
+        return not_modified(etag) or with_etag(
+            Response(stream_users(stream == 'ndjson', fields),
+                     mimetype=mimetype), etag)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    if limit is None and cursor is None:
+        return not_modified(etag) or with_etag(jsonify(
+            [user.to_json(fields=fields) for user in User.all()]), etag)
+    if limit is None:
+        limit = MAX_PAGE_SIZE
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+        limit = min(limit, MAX_PAGE_SIZE)
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None:
+            return jsonify({'error': "invalid cursor"}), 400
+    response = not_modified(etag)
+    if response is not None:
+        return response
+    users, next_key = User.page(limit, after)
+    return with_etag(jsonify({
+        'users': [user.to_json(fields=fields) for user in users],
+        'next_cursor': encode_cursor(next_key)}), etag)
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -21,8 +154,11 @@ def view_one_user(user_id: str = None) -> str:
     """ GET /api/v1/users/:id
     Path parameter:
       - User ID
+    Query parameter (optional):
+      - fields: comma-separated attributes to return
     Return:
       - User object JSON represented
+      - 304 if If-None-Match holds the ETag of the current User
       - 404 if the User ID doesn't exist
     """
     if user_id is None:
@@ -30,7 +166,9 @@ def view_one_user(user_id: str = None) -> str:
     user = User.get(user_id)
     if user is None:
         abort(404)
-    return jsonify(user.to_json())
+    etag = user.etag()
+    return not_modified(etag) or with_etag(
+        jsonify(user.to_json(fields=requested_fields())), etag)
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
@@ -59,6 +197,8 @@ def create_user() -> str:
       - password
       - last_name (optional)
       - first_name (optional)
+    Query parameter (optional):
+      - fields: comma-separated attributes to return
     Return:
       - User object JSON represented
       - 400 if can't create the new User
@@ -83,7 +223,8 @@ def create_user() -> str:
             user.first_name = rj.get("first_name")
             user.last_name = rj.get("last_name")
             user.save()
-            return jsonify(user.to_json()), 201
+            return with_etag(jsonify(user.to_json(
+                fields=requested_fields())), user.etag()), 201
         except Exception as e:
             error_msg = "Can't create User: {}".format(e)
     return jsonify({'error': error_msg}), 400
@@ -97,6 +238,8 @@ def update_user(user_id: str = None) -> str:
     JSON body:
       - last_name (optional)
       - first_name (optional)
+    Query parameter (optional):
+      - fields: comma-separated attributes to return
     Return:
       - User object JSON represented
       - 404 if the User ID doesn't exist
@@ -118,5 +261,126 @@ def update_user(user_id: str = None) -> str:
         user.first_name = rj.get('first_name')
     if rj.get('last_name') is not None:
         user.last_name = rj.get('last_name')
-    user.save()
-    return jsonify(user.to_json()), 200
+    try:
+        user.save()
+    except ValueError as e:
+        return jsonify({'error': "Can't update User: {}".format(e)}), 400
+    return with_etag(jsonify(user.to_json(fields=requested_fields())),
+                     user.etag()), 200
+
+
+def run_batch(operation: Callable[[object, list], dict]) -> str:
+    """ Apply an operation to each item of the JSON list body
+
+    Every change is made in one User.batch(), so the users are persisted
+    once for the whole request.
+    """
+    try:
+        items = request.get_json()
+    except Exception as e:
+        items = None
+    if not isinstance(items, list):
+        return jsonify({'error': "Wrong format"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': "at most {} items allowed".format(
+            MAX_BATCH_SIZE)}), 400
+    fields = requested_fields()
+    with User.batch():
+        results = [operation(item, fields) for item in items]
+    return jsonify({'results': results}), 200
+
+
+def batch_create(item: object, fields: list) -> dict:
+    """ Create one user of a batch
+    """
+    if not isinstance(item, dict):
+        return {'status': 400, 'error': "Wrong format"}
+    if item.get("email", "") == "":
+        return {'status': 400, 'error': "email missing"}
+    if item.get("password", "") == "":
+        return {'status': 400, 'error': "password missing"}
+    try:
+        user = User()
+        user.email = item.get("email")
+        user.password = item.get("password")
+        user.first_name = item.get("first_name")
+        user.last_name = item.get("last_name")
+        user.save()
+    except Exception as e:
+        return {'status': 400, 'error': "Can't create User: {}".format(e)}
+    return {'status': 201, 'user': user.to_json(fields=fields)}
+
+
+def batch_update(item: object, fields: list) -> dict:
+    """ Update one user of a batch
+    """
+    if not isinstance(item, dict) or not isinstance(item.get('id'), str):
+        return {'status': 400, 'error': "Wrong format"}
+    user = User.get(item.get('id'))
+    if user is None:
+        return {'status': 404, 'error': "Not found"}
+    if item.get('first_name') is not None:
+        user.first_name = item.get('first_name')
+    if item.get('last_name') is not None:
+        user.last_name = item.get('last_name')
+    try:
+        user.save()
+    except ValueError as e:
+        return {'status': 400, 'error': "Can't update User: {}".format(e)}
+    return {'status': 200, 'user': user.to_json(fields=fields)}
+
+
+def batch_delete(item: object, fields: list) -> dict:
+    """ Delete one user of a batch
+    """
+    if not isinstance(item, str):
+        return {'status': 400, 'error': "Wrong format"}
+    user = User.get(item)
+    if user is None:
+        return {'status': 404, 'error': "Not found"}
+    user.remove()
+    return {'status': 200}
+
+
+@app_views.route('/users/batch', methods=['POST'], strict_slashes=False)
+def create_users() -> str:
+    """ POST /api/v1/users/batch
+    JSON body:
+      - list of users to create, with the parameters of POST /api/v1/users
+    Query parameter (optional):
+      - fields: comma-separated attributes to return
+    Return:
+      - {"results": [...]} with, for each user in order, its `status`
+        (201 or 400) and the `user` created or an `error`
+      - 400 if the body isn't a list of at most API_MAX_BATCH_SIZE items
+    """
+    return run_batch(batch_create)
+
+
+@app_views.route('/users/batch', methods=['PATCH'], strict_slashes=False)
+def update_users() -> str:
+    """ PATCH /api/v1/users/batch
+    JSON body:
+      - list of updates: `id`, `last_name` (optional) and
+        `first_name` (optional)
+    Query parameter (optional):
+      - fields: comma-separated attributes to return
+    Return:
+      - {"results": [...]} with, for each update in order, its `status`
+        (200, 400 or 404) and the `user` updated or an `error`
+      - 400 if the body isn't a list of at most API_MAX_BATCH_SIZE items
+    """
+    return run_batch(batch_update)
+
+
+@app_views.route('/users/batch', methods=['DELETE'], strict_slashes=False)
+def delete_users() -> str:
+    """ DELETE /api/v1/users/batch
+    JSON body:
+      - list of User IDs
+    Return:
+      - {"results": [...]} with, for each ID in order, its `status`
+        (200, 400 or 404) and an `error` if any
+      - 400 if the body isn't a list of at most API_MAX_BATCH_SIZE items
+    """
+    return run_batch(batch_delete)
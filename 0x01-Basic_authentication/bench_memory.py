@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+""" Memory benchmark of User instances
+
+Builds N users from JSON dicts, as load_from_file does, and reports the
+bytes per user allocated meanwhile according to tracemalloc: the
+instance and its two datetimes. Strings come from the JSON dicts, are
+the same whatever the layout of the model, and are not counted. Point
+--models at another checkout of this directory to compare with it.
+
+Usage: ./bench_memory.py [-n USERS] [--models DIR]
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+
+def parse_args() -> argparse.Namespace:
+    """ Command line options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--users', type=int, default=1000000)
+    parser.add_argument('--models',
+                        default=os.path.dirname(os.path.abspath(__file__)),
+                        help="directory holding the models package")
+    return parser.parse_args()
+
+
+def main():
+    """ Run the benchmark and print the bytes per user
+    """
+    args = parse_args()
+    sys.path.insert(0, os.path.abspath(args.models))
+    from models.base import DATA
+    from models.user import User
+
+    timestamp = '2024-01-02T03:04:05'
+    raw = [{'id': '{:036d}'.format(i), 'created_at': timestamp,
+            'updated_at': timestamp, 'email': 'user{}@example.com'.format(i),
+            '_password': 'x' * 100, 'first_name': 'First',
+            'last_name': 'Last'} for i in range(args.users)]
+    DATA['User'] = {}
+
+    tracemalloc.start()
+    users = [User(**obj_json) for obj_json in raw]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Not counted: the list holding the users
+    current -= sys.getsizeof(users)
+    print("{} users, {} bytes/user ({})".format(
+        len(users), round(current / len(users)),
+        os.path.abspath(args.models)))
+
+
+if __name__ == "__main__":
+    main()
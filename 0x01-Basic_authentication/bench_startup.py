@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+""" Startup benchmark of User.load_from_file
+
+Writes a snapshot of N users in a temporary directory, then times
+User.load_from_file() in a fresh process for each loading mode,
+reporting the elapsed time and the peak RSS of that process. Point
+--models at another checkout of this directory to compare with it.
+
+Usage: ./bench_startup.py [-n USERS ...] [--models DIR] [--modes MODE ...]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+def parse_args() -> argparse.Namespace:
+    """ Command line options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-n', '--users', type=int, nargs='+',
+                        default=[100000, 1000000])
+    parser.add_argument('--models',
+                        default=os.path.dirname(os.path.abspath(__file__)),
+                        help="directory holding the models package")
+    parser.add_argument('--modes', nargs='+', choices=('eager', 'lazy'),
+                        default=['eager', 'lazy'],
+                        help="STORAGE_LAZY_LOAD=0 or 1")
+    parser.add_argument('--load', action='store_true',
+                        help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def write_snapshot(file_path: str, count: int):
+    """ Write a .db_User.json of `count` users, one member at a time
+    """
+    timestamp = '2024-01-02T03:04:05'
+    with open(file_path, 'w') as f:
+        f.write('{')
+        for i in range(count):
+            obj_id = str(uuid.uuid4())
+            obj_json = {'id': obj_id, 'created_at': timestamp,
+                        'updated_at': timestamp,
+                        'email': 'user{}@example.com'.format(i),
+                        '_password': 'x' * 100, 'first_name': 'First',
+                        'last_name': 'Last'}
+            f.write('{}{}: {}'.format(', ' if i else '', json.dumps(obj_id),
+                                      json.dumps(obj_json)))
+        f.write('}')
+
+
+def load(models: str):
+    """ Load the snapshot of the current directory and print the elapsed
+    time and peak RSS as JSON
+    """
+    sys.path.insert(0, models)
+    from models.user import User
+
+    start = time.perf_counter()
+    User.load_from_file()
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    print(json.dumps({'seconds': elapsed, 'peak_rss': peak,
+                      'users': User.count()}))
+
+
+def main():
+    """ Run the benchmark, printing one line per user count and mode
+    """
+    args = parse_args()
+    if args.load:
+        load(args.models)
+        return
+    print("{:>9} {:>6} {:>9} {:>13}".format('users', 'mode', 'seconds',
+                                            'peak RSS MiB'))
+    for count in args.users:
+        with tempfile.TemporaryDirectory(prefix='bench_startup.') as tmp:
+            write_snapshot(os.path.join(tmp, '.db_User.json'), count)
+            for mode in args.modes:
+                env = dict(os.environ, STORAGE_MODE='file',
+                           STORAGE_LAZY_LOAD='1' if mode == 'lazy' else '0')
+                out = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--load',
+                     '--models', os.path.abspath(args.models)],
+                    cwd=tmp, env=env, check=True, stdout=subprocess.PIPE)
+                result = json.loads(out.stdout)
+                assert result['users'] == count, result
+                print("{:>9} {:>6} {:>9.2f} {:>13.0f}".format(
+                    count, mode, result['seconds'],
+                    result['peak_rss'] / (1 << 20)))
+
+
+if __name__ == "__main__":
+    main()
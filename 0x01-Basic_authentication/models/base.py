@@ -1,40 +1,128 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from typing import TypeVar, List, Iterable, Iterator, Tuple, TextIO
+from os import getenv, path
+import bisect
+import itertools
 import json
+import os
+import tempfile
+import threading
 import uuid
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+# Per class and unique attribute, the values that several objects already
+# shared when loaded, with the ids of these objects
+DUPLICATES = {}
+# Per class, a list of (created_at, id) keys kept sorted for pagination,
+# and the key each id was inserted with
+ORDER = {}
+ORDER_KEYS = {}
+
+# 'file' rewrites the whole snapshot on every change, 'log' appends one
+# JSON line per change and compacts into the snapshot periodically
+STORAGE_MODE = getenv('STORAGE_MODE', 'file')
+COMPACT_EVERY = int(getenv('STORAGE_COMPACT_EVERY', '1000'))
+LOG_SIZES = {}
+# Keep loaded objects as raw JSON dicts until first accessed
+LAZY_LOAD = getenv('STORAGE_LAZY_LOAD', '0') == '1'
+FIELDS = {}
+# Mode of newly created files, as open() would set it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+# ETags combine a per-process epoch with a per-class generation, bumped on
+# every save/remove, or with a per-object revision, renewed on every change
+EPOCH = uuid.uuid4().hex[:12]
+GENERATIONS = {}
+REVISIONS = itertools.count(1)
+# Serialized forms of recently returned objects, keyed by revision
+JSON_CACHE = OrderedDict()
+JSON_CACHE_SIZE = int(getenv('SERIALIZATION_CACHE_SIZE', '1024'))
+JSON_CACHE_LOCK = threading.Lock()
+# Changes whose persistence is deferred by Base.batch(), per thread
+BATCH = threading.local()
+# Per class, the lock serializing writers; readers never take it
+LOCKS = {}
 
 
 class Base():
     """ Base class
+
+    Subclasses can declare secondary hash indexes on attributes with
+    `INDEXED_ATTRIBUTES`; attributes listed in `UNIQUE_ATTRIBUTES` are
+    indexed too; `save()`, and setting them on a stored object, refuse a
+    value already held by another object. Objects loaded from a file that
+    already share a unique value can still be saved with it, but no other
+    object can take it.
+
+    Attributes are stored in `__slots__` rather than a per-instance
+    `__dict__`; subclasses list their own attributes the same way.
+
+    The revision of an object is renewed when an attribute is set, and
+    serialized forms are cached by revision, so attribute values must not
+    be mutated in place.
+
+    Changes to the objects of a class (save, remove, loading and writing
+    the file, moving indexed attributes) are serialized by a per-class
+    lock. Reads don't lock: they copy what they iterate, with single
+    C-level operations that are atomic under the GIL.
     """
 
+    __slots__ = ('id', 'created_at', 'updated_at', '_rev')
+
+    INDEXED_ATTRIBUTES: Tuple[str, ...] = ()
+    UNIQUE_ATTRIBUTES: Tuple[str, ...] = ()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            with self.__class__._lock():
+                if DATA.get(s_class) is None:
+                    DATA[s_class] = {}
+                    self.__class__._reset_indexes()
 
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        if 'id' in kwargs:
+            self.id = kwargs['id']
+        else:
+            self.id = str(uuid.uuid4())
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, keeping indexes in sync for stored objects
+
+        Raises ValueError, leaving the object and its indexes unchanged,
+        if a stored object is given a unique value held by another one.
+        """
+        indexes = INDEXES.get(self.__class__.__name__)
+        if indexes and name in indexes and self._is_stored():
+            with self.__class__._lock():
+                if name in self.__class__.UNIQUE_ATTRIBUTES:
+                    self.__class__._check_unique_value(self.id, name, value)
+                index = indexes[name]
+                _index_discard(index, getattr(self, name, None), self.id)
+                object.__setattr__(self, name, value)
+                _index_add(index, value, self.id)
+        else:
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_rev', None)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -44,62 +132,296 @@ class Base():
             return False
         return (self.id == other.id)
 
-    def to_json(self, for_serialization: bool = False) -> dict:
+    def to_json(self, for_serialization: bool = False,
+                fields: Iterable[str] = None) -> dict:
         """ Convert the object a JSON dictionary
+
+        Private attributes are only included `for_serialization`; `fields`
+        restricts the result to the given attribute names. The forms built
+        for API responses are kept in a bounded LRU cache; the ones built
+        for the snapshot of every object are not.
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
-                result[key] = value
-        return result
+        # Taken before reading the attributes, so a concurrent change
+        # can't get a form read before it cached under its revision
+        rev = self._revision()
+        cached = _cached_json(rev)
+        if cached is None:
+            cached = {}
+            for key, value in self._attributes():
+                if type(value) is datetime:
+                    cached[key] = value.strftime(TIMESTAMP_FORMAT)
+                else:
+                    cached[key] = value
+            if not for_serialization:
+                _cache_json(rev, cached)
+        if fields is not None:
+            return {key: cached[key] for key in fields if key in cached
+                    and (for_serialization or key[0] != '_')}
+        if for_serialization:
+            return dict(cached)
+        return {key: value for key, value in cached.items()
+                if key[0] != '_'}
+
+    def etag(self) -> str:
+        """ Strong ETag of the current state of the object
+        """
+        return "{}-{}".format(EPOCH, self._revision())
+
+    def _revision(self) -> int:
+        """ Revision of the current state of the object
+        """
+        rev = getattr(self, '_rev', None)
+        if rev is None:
+            rev = next(REVISIONS)
+            object.__setattr__(self, '_rev', rev)
+        return rev
+
+    @classmethod
+    def collection_etag(cls) -> str:
+        """ Strong ETag of the set of objects of the class, as saved
+        """
+        return "{}-g{}".format(EPOCH, GENERATIONS.get(cls.__name__, 0))
+
+    @classmethod
+    def _lock(cls) -> threading.RLock:
+        """ Lock serializing the changes to the objects of the class
+        """
+        lock = LOCKS.get(cls.__name__)
+        if lock is None:
+            lock = LOCKS.setdefault(cls.__name__, threading.RLock())
+        return lock
+
+    @classmethod
+    def _bump_generation(cls):
+        """ Record a change to the objects of the class
+        """
+        s_class = cls.__name__
+        GENERATIONS[s_class] = GENERATIONS.get(s_class, 0) + 1
+
+    def _attributes(self) -> Iterator[Tuple[str, object]]:
+        """ Iterate over the (name, value) pairs of the attributes set
+        on the object, in declaration order
+        """
+        for key in self.__class__._fields():
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                yield key, value
+        extra = getattr(self, '__dict__', None)
+        if extra:
+            yield from extra.items()
+
+    @classmethod
+    def _fields(cls) -> Tuple[str, ...]:
+        """ Names of the slots declared by the class and its bases
+        """
+        fields = FIELDS.get(cls)
+        if fields is None:
+            fields = tuple(
+                name for klass in reversed(cls.__mro__)
+                for name in klass.__dict__.get('__slots__', ())
+                if name not in ('__dict__', '__weakref__', '_rev')
+            )
+            FIELDS[cls] = fields
+        return fields
 
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file, then replay the change log
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        with cls._lock():
+            DATA[s_class] = LazyObjects(cls) if LAZY_LOAD else {}
+            cls._reset_indexes()
+            if path.exists(file_path):
+                with open(file_path, 'r') as f:
+                    for obj_id, obj_json in iter_json_object(f):
+                        cls._load_one(obj_id, obj_json)
+            if cls._replay_log():
+                cls.save_to_file()
+            cls._rebuild_indexes()
+            cls._bump_generation()
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
+
+        The snapshot is written to a temporary file, synced to disk and
+        renamed over the previous one, keeping its permissions; then the
+        change log it now contains is truncated.
         """
         s_class = cls.__name__
         file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        with cls._lock():
+            objs_json = {}
+            for obj_id, obj in _peek_items(DATA[s_class]):
+                if isinstance(obj, dict):
+                    objs_json[obj_id] = obj
+                else:
+                    objs_json[obj_id] = obj.to_json(True)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+            fd, tmp_path = tempfile.mkstemp(prefix=".db_{}.".format(s_class),
+                                            dir=path.dirname(file_path) or '.')
+            try:
+                try:
+                    mode = os.stat(file_path).st_mode & 0o777
+                except FileNotFoundError:
+                    mode = FILE_MODE
+                os.fchmod(fd, mode)
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(objs_json, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            _fsync_dir(path.dirname(file_path) or '.')
+
+            log_path = ".db_{}.log".format(s_class)
+            if path.exists(log_path):
+                open(log_path, 'w').close()
+            LOG_SIZES[s_class] = 0
+
+    @classmethod
+    def _append_log(cls, op: str, obj_id: str, obj_json: dict = None):
+        """ Append one change record to the log
+        """
+        record = {'op': op, 'id': obj_id}
+        if obj_json is not None:
+            record['obj'] = obj_json
+        cls._append_records([record])
+
+    @classmethod
+    def _append_records(cls, records: List[dict]):
+        """ Append change records to the log in one write, compacting when
+        it has grown past COMPACT_EVERY records
+        """
+        s_class = cls.__name__
+        with cls._lock():
+            with open(".db_{}.log".format(s_class), 'a') as f:
+                f.write(''.join(json.dumps(record) + "\n"
+                                for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+            LOG_SIZES[s_class] = LOG_SIZES.get(s_class, 0) + len(records)
+            if LOG_SIZES[s_class] >= COMPACT_EVERY:
+                cls.save_to_file()
+
+    @classmethod
+    def _replay_log(cls) -> bool:
+        """ Apply the change log on top of DATA
+
+        Replay stops at the first unreadable record, which can only be a
+        write torn by a crash. Returns True if the log had any content.
+        """
+        s_class = cls.__name__
+        log_path = ".db_{}.log".format(s_class)
+        LOG_SIZES[s_class] = 0
+        if not path.exists(log_path) or path.getsize(log_path) == 0:
+            return False
+
+        with open(log_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get('op') == 'save':
+                    cls._load_one(record['id'], record['obj'])
+                elif record.get('op') == 'remove':
+                    DATA[s_class].pop(record['id'], None)
+        return True
+
+    @classmethod
+    def _load_one(cls, obj_id: str, obj_json: dict):
+        """ Store one loaded object, or its raw JSON when loading lazily
+        """
+        objs = DATA[cls.__name__]
+        if isinstance(objs, LazyObjects):
+            objs.put_raw(obj_id, obj_json)
+        else:
+            objs[obj_id] = cls(**obj_json)
+
+    @classmethod
+    def _persist(cls, op: str, obj: TypeVar('Base')):
+        """ Persist one change according to STORAGE_MODE, or defer it to
+        the end of the current batch
+        """
+        pending = getattr(BATCH, 'pending', None)
+        if pending is not None:
+            pending.setdefault(cls, []).append((op, obj))
+            return
+        if STORAGE_MODE == 'log':
+            obj_json = obj.to_json(True) if op == 'save' else None
+            cls._append_log(op, obj.id, obj_json)
+        else:
+            cls.save_to_file()
+
+    @staticmethod
+    @contextmanager
+    def batch():
+        """ Defer the persistence of the saves and removes of the block
+
+        Objects are stored and removed in memory right away. When the
+        outermost batch of the thread exits, even on error, each class
+        changed is persisted once: one snapshot rewrite, or one append of
+        all its change records when STORAGE_MODE is 'log'.
+        """
+        if getattr(BATCH, 'pending', None) is not None:
+            yield
+            return
+        BATCH.pending = {}
+        try:
+            yield
+        finally:
+            pending, BATCH.pending = BATCH.pending, None
+            for cls, changes in pending.items():
+                cls._flush(changes)
+
+    @classmethod
+    def _flush(cls, changes: List[Tuple[str, TypeVar('Base')]]):
+        """ Persist the changes deferred by a batch
+        """
+        if STORAGE_MODE != 'log':
+            cls.save_to_file()
+            return
+        with cls._lock():
+            records = []
+            for op, obj in changes:
+                record = {'op': op, 'id': obj.id}
+                if op == 'save':
+                    record['obj'] = obj.to_json(True)
+                records.append(record)
+            cls._append_records(records)
 
     def save(self):
         """ Save current object
         """
         s_class = self.__class__.__name__
-        self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        with self.__class__._lock():
+            self.__class__._check_unique(self)
+            self.updated_at = datetime.utcnow()
+            previous = DATA[s_class].get(self.id)
+            if previous is not self:
+                if previous is not None:
+                    self.__class__._unindex(previous)
+                DATA[s_class][self.id] = self
+                self.__class__._index(self)
+            self.__class__._bump_generation()
+            self.__class__._persist('save', self)
 
     def remove(self):
         """ Remove object
         """
         s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        with self.__class__._lock():
+            obj = DATA[s_class].get(self.id)
+            if obj is not None:
+                del DATA[s_class][self.id]
+                self.__class__._unindex(obj)
+                self.__class__._bump_generation()
+                self.__class__._persist('remove', obj)
 
     @classmethod
     def count(cls) -> int:
@@ -121,6 +443,29 @@ class Base():
         s_class = cls.__name__
         return DATA[s_class].get(id)
 
+    @classmethod
+    def page(cls, limit: int, after: Tuple[str, str] = None
+             ) -> Tuple[List[TypeVar('Base')], Tuple[str, str]]:
+        """ Return up to `limit` objects ordered by (created_at, id)
+
+        `after` is the key of the last object of the previous page. The
+        returned key is that of the last object of this page, or None if
+        there are no more objects.
+        """
+        s_class = cls.__name__
+        keys = ORDER.get(s_class, [])
+        start = bisect.bisect_right(keys, tuple(after)) if after else 0
+        chunk = keys[start:start + limit]
+        if after:
+            # Keys inserted before `start` meanwhile shift the slice
+            chunk = [key for key in chunk if key > tuple(after)]
+        objs = DATA[s_class]
+        page = [obj for obj in (objs.get(key[1]) for key in chunk)
+                if obj is not None]
+        if not chunk or start + limit >= len(keys):
+            return page, None
+        return page, chunk[-1]
+
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
@@ -133,5 +478,379 @@ class Base():
                 if (getattr(obj, k) != v):
                     return False
             return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+
+        candidates = cls._candidates(attributes)
+        if candidates is None:
+            candidates = list(DATA[s_class].values())
+        return list(filter(_search, candidates))
+
+    @classmethod
+    def _indexed(cls) -> Tuple[str, ...]:
+        """ Names of all indexed attributes of the class
+        """
+        return cls.INDEXED_ATTRIBUTES + cls.UNIQUE_ATTRIBUTES
+
+    def _is_stored(self) -> bool:
+        """ Whether this exact object is the one held in DATA
+        """
+        objs = DATA.get(self.__class__.__name__)
+        if objs is None:
+            return False
+        return dict.get(objs, getattr(self, 'id', None)) is self
+
+    @classmethod
+    def _reset_indexes(cls):
+        """ Drop every index entry of the class
+        """
+        INDEXES[cls.__name__] = {attr: {} for attr in cls._indexed()}
+        DUPLICATES[cls.__name__] = {attr: {}
+                                    for attr in cls.UNIQUE_ATTRIBUTES}
+        ORDER[cls.__name__] = []
+        ORDER_KEYS[cls.__name__] = {}
+
+    @classmethod
+    def _rebuild_indexes(cls):
+        """ Rebuild every index of the class from DATA
+        """
+        cls._reset_indexes()
+        order_keys = ORDER_KEYS[cls.__name__]
+        for obj_id, obj in _peek_items(DATA[cls.__name__]):
+            for attr, index in INDEXES[cls.__name__].items():
+                if isinstance(obj, dict):
+                    value = obj.get(attr)
+                else:
+                    value = getattr(obj, attr, None)
+                _index_add(index, value, obj_id)
+            order_keys[obj_id] = _order_key(obj_id, obj)
+        ORDER[cls.__name__] = sorted(order_keys.values())
+        for attr, duplicates in DUPLICATES[cls.__name__].items():
+            for value, ids in INDEXES[cls.__name__][attr].items():
+                if len(ids) > 1:
+                    duplicates[value] = frozenset(ids)
+
+    @classmethod
+    def _index(cls, obj: TypeVar('Base')):
+        """ Add an object to every index of its class
+        """
+        for attr, index in INDEXES[cls.__name__].items():
+            _index_add(index, getattr(obj, attr, None), obj.id)
+        key = _order_key(obj.id, obj)
+        ORDER_KEYS[cls.__name__][obj.id] = key
+        bisect.insort(ORDER[cls.__name__], key)
+
+    @classmethod
+    def _unindex(cls, obj: TypeVar('Base')):
+        """ Remove an object from every index of its class
+        """
+        for attr, index in INDEXES[cls.__name__].items():
+            _index_discard(index, getattr(obj, attr, None), obj.id)
+        key = ORDER_KEYS[cls.__name__].pop(obj.id, None)
+        if key is not None:
+            keys = ORDER[cls.__name__]
+            i = bisect.bisect_left(keys, key)
+            if i < len(keys) and keys[i] == key:
+                del keys[i]
+
+    @classmethod
+    def _check_unique(cls, obj: TypeVar('Base')):
+        """ Raise ValueError if a unique value is held by another object
+        """
+        for attr in cls.UNIQUE_ATTRIBUTES:
+            cls._check_unique_value(obj.id, attr, getattr(obj, attr, None))
+
+    @classmethod
+    def _check_unique_value(cls, obj_id: str, attr: str, value):
+        """ Raise ValueError if `value` of the unique attribute `attr` is
+        held by an object other than `obj_id`
+        """
+        if value is None:
+            return
+        ids = _index_lookup(INDEXES[cls.__name__][attr], value)
+        if not ids or ids == {obj_id}:
+            return
+        try:
+            loaded = DUPLICATES.get(cls.__name__, {}).get(attr, {}).get(
+                value, ())
+        except TypeError:
+            loaded = ()
+        if obj_id in loaded and ids <= loaded:
+            return
+        raise ValueError("{} {} already exists".format(attr, value))
+
+    @classmethod
+    def _candidates(cls, attributes: dict) -> List[TypeVar('Base')]:
+        """ Objects possibly matching `attributes` according to the
+        narrowest covering index, or None if no index applies
+        """
+        indexes = INDEXES.get(cls.__name__, {})
+        best = None
+        for k, v in attributes.items():
+            if k not in indexes:
+                continue
+            ids = _index_lookup(indexes[k], v)
+            if ids is None:
+                continue
+            if best is None or len(ids) < len(best):
+                best = ids
+        if best is None:
+            return None
+        objs = DATA[cls.__name__]
+        return [obj for obj in map(objs.get, list(best)) if obj is not None]
+
+
+def parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string
+
+    datetime.fromisoformat is much faster than strptime and reads the
+    fixed-width format exactly; anything else goes through strptime.
+    """
+    if len(value) == 19 and value[10] == 'T':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+def iter_json_object(f: TextIO, chunk_size: int = 1 << 16
+                     ) -> Iterator[Tuple[str, object]]:
+    """ Iterate over the members of a JSON object stored in a file
+
+    The file is read in chunks and each member is decoded as soon as it
+    is complete, so memory use is bounded by the largest member rather
+    than by the whole document.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        buf = buf[pos:] + chunk
+        pos = 0
+        eof = chunk == ''
+        return not eof
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\n\r':
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    def expect(chars: str) -> str:
+        nonlocal pos
+        skip_ws()
+        if pos >= len(buf) or buf[pos] not in chars:
+            raise ValueError("Expected one of {!r} at offset {}"
+                             .format(chars, pos))
+        pos += 1
+        return buf[pos - 1]
+
+    def decode():
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if fill():
+                    continue
+                raise
+            # A number or literal may continue in the next chunk: only
+            # accept it once followed by a separator, or at the end
+            after = end
+            while after < len(buf) and buf[after] in ' \t\n\r':
+                after += 1
+            if (after == len(buf) or buf[after] not in ',:}') and fill():
+                continue
+            pos = end
+            return value
+
+    expect('{')
+    skip_ws()
+    if pos < len(buf) and buf[pos] == '}':
+        return
+    while True:
+        key = decode()
+        expect(':')
+        yield key, decode()
+        if expect(',}') == '}':
+            return
+
+
+class LazyObjects(dict):
+    """ Objects of a class keyed by id, holding raw JSON dicts until an
+    object is first accessed
+
+    Only the accessors used by Base are overridden; `dict.get` and
+    `_peek_items` see stored values without building them. Storing an
+    object and replacing raw JSON by the object built from it share a
+    lock, so a reader never overwrites a value stored meanwhile.
+    """
+
+    def __init__(self, cls: type):
+        """ Initialize an empty store for `cls`
+        """
+        super().__init__()
+        self._cls = cls
+        self._lock = threading.Lock()
+
+    def __setitem__(self, key: str, value):
+        """ Store an object under `key`
+        """
+        with self._lock:
+            dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: str):
+        """ Remove the object stored under `key`
+        """
+        with self._lock:
+            dict.__delitem__(self, key)
+
+    def put_raw(self, key: str, obj_json: dict):
+        """ Store the raw JSON of an object
+        """
+        dict.__setitem__(self, key, obj_json)
+
+    def _build(self, key: str, value):
+        """ Replace raw JSON by the object it describes
+        """
+        if not isinstance(value, dict):
+            return value
+        obj = self._cls(**value)
+        with self._lock:
+            current = dict.get(self, key, _MISSING)
+            if current is value:
+                dict.__setitem__(self, key, obj)
+                return obj
+        # Built, replaced or removed by another thread meanwhile
+        if current is _MISSING:
+            return obj
+        return self._build(key, current)
+
+    def __getitem__(self, key: str):
+        """ Return the object stored under `key`
+        """
+        return self._build(key, dict.__getitem__(self, key))
+
+    def get(self, key: str, default=None):
+        """ Return the object stored under `key`, or `default`
+        """
+        value = dict.get(self, key, _MISSING)
+        if value is _MISSING:
+            return default
+        return self._build(key, value)
+
+    def pop(self, key: str, *default):
+        """ Remove and return the object stored under `key`
+        """
+        value = dict.pop(self, key, _MISSING)
+        if value is _MISSING:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return self._cls(**value) if isinstance(value, dict) else value
+
+    def values(self) -> List:
+        """ Return all objects, building the ones still raw
+        """
+        return [self._build(key, value)
+                for key, value in list(dict.items(self))]
+
+    def items(self) -> List[Tuple[str, object]]:
+        """ Return all (id, object) pairs, building the ones still raw
+        """
+        return [(key, self._build(key, value))
+                for key, value in list(dict.items(self))]
+
+
+_MISSING = object()
+
+
+def _cached_json(rev: int) -> dict:
+    """ Serialized form cached for a revision, or None
+    """
+    if rev is None:
+        return None
+    with JSON_CACHE_LOCK:
+        cached = JSON_CACHE.get(rev)
+        if cached is not None:
+            JSON_CACHE.move_to_end(rev)
+        return cached
+
+
+def _cache_json(rev: int, obj_json: dict):
+    """ Cache the serialized form of a revision, evicting the least
+    recently used ones past JSON_CACHE_SIZE
+    """
+    if JSON_CACHE_SIZE <= 0:
+        return
+    with JSON_CACHE_LOCK:
+        JSON_CACHE[rev] = obj_json
+        while len(JSON_CACHE) > JSON_CACHE_SIZE:
+            JSON_CACHE.popitem(last=False)
+
+
+def _fsync_dir(dir_path: str):
+    """ Sync a directory, so that a rename in it survives a crash
+    """
+    fd = os.open(dir_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _peek_items(objs: dict) -> List[Tuple[str, object]]:
+    """ All (id, value) pairs of a store without building raw objects
+    """
+    return list(dict.items(objs))
+
+
+def _order_key(obj_id: str, obj) -> Tuple[str, str]:
+    """ Pagination key of an object or of its raw JSON
+    """
+    if isinstance(obj, dict):
+        created_at = obj.get('created_at') or ''
+    elif isinstance(getattr(obj, 'created_at', None), datetime):
+        created_at = obj.created_at.strftime(TIMESTAMP_FORMAT)
+    else:
+        created_at = ''
+    return (created_at, obj_id)
+
+
+def _index_lookup(index: dict, value) -> set:
+    """ Ids stored under `value`, or None if `value` can't be indexed
+    """
+    try:
+        return index.get(value, set())
+    except TypeError:
+        return None
+
+
+def _index_add(index: dict, value, obj_id: str):
+    """ Store `obj_id` under `value`
+    """
+    try:
+        index.setdefault(value, set()).add(obj_id)
+    except TypeError:
+        pass
+
+
+def _index_discard(index: dict, value, obj_id: str):
+    """ Remove `obj_id` from under `value`
+    """
+    try:
+        ids = index.get(value)
+    except TypeError:
+        return
+    if ids is not None:
+        ids.discard(obj_id)
+        if not ids:
+            del index[value]
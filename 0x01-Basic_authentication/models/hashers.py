@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+""" Password hashers module
+
+Hashes are self-describing strings "algorithm$params$salt$hash", so the
+hasher that produced a stored password is always known. Legacy unsalted
+SHA256 hex digests, which have no "$", are still recognized.
+"""
+import hashlib
+import hmac
+import secrets
+from os import getenv
+from typing import Dict, Tuple
+
+try:
+    import bcrypt
+except ImportError:  # bcrypt is optional
+    bcrypt = None
+
+
+HASHERS: Dict[str, 'Hasher'] = {}
+DEFAULT_HASHER = getenv('USER_PASSWORD_HASHER', 'pbkdf2_sha256')
+
+
+class Hasher():
+    """ Base class of password hashers
+    """
+
+    algorithm = None
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password into a self-describing string
+        """
+        raise NotImplementedError()
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against a string produced by encode()
+        """
+        raise NotImplementedError()
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Whether a string was produced with weaker parameters than
+        the current ones
+        """
+        return False
+
+
+class PBKDF2Hasher(Hasher):
+    """ PBKDF2-HMAC-SHA256 hasher
+    """
+
+    algorithm = 'pbkdf2_sha256'
+    iterations = int(getenv('PBKDF2_ITERATIONS', '260000'))
+
+    def _digest(self, pwd: str, salt: str, iterations: int) -> str:
+        """ Derive the hex digest of a password
+        """
+        return hashlib.pbkdf2_hmac('sha256', pwd.encode(), salt.encode(),
+                                   iterations).hex()
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password into a self-describing string
+        """
+        salt = secrets.token_hex(16)
+        digest = self._digest(pwd, salt, self.iterations)
+        return "{}${}${}${}".format(self.algorithm, self.iterations,
+                                    salt, digest)
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against a string produced by encode()
+        """
+        _, iterations, salt, digest = encoded.split('$')
+        return hmac.compare_digest(
+            self._digest(pwd, salt, int(iterations)), digest)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Whether fewer iterations than configured were used
+        """
+        return int(encoded.split('$')[1]) < self.iterations
+
+
+class ScryptHasher(Hasher):
+    """ scrypt hasher
+    """
+
+    algorithm = 'scrypt'
+    n = int(getenv('SCRYPT_N', '16384'))
+    r = 8
+    p = 1
+
+    def _digest(self, pwd: str, salt: str, n: int, r: int, p: int) -> str:
+        """ Derive the hex digest of a password
+        """
+        return hashlib.scrypt(pwd.encode(), salt=salt.encode(), n=n, r=r,
+                              p=p, maxmem=2 * 128 * n * r * p).hex()
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password into a self-describing string
+        """
+        salt = secrets.token_hex(16)
+        digest = self._digest(pwd, salt, self.n, self.r, self.p)
+        return "{}${},{},{}${}${}".format(self.algorithm, self.n, self.r,
+                                          self.p, salt, digest)
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against a string produced by encode()
+        """
+        _, params, salt, digest = encoded.split('$')
+        n, r, p = (int(param) for param in params.split(','))
+        return hmac.compare_digest(self._digest(pwd, salt, n, r, p), digest)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Whether a lower cost than configured was used
+        """
+        params = encoded.split('$')[1]
+        n, r, p = (int(param) for param in params.split(','))
+        return (n, r, p) < (self.n, self.r, self.p)
+
+
+class BCryptHasher(Hasher):
+    """ bcrypt hasher, available when the bcrypt package is installed
+    """
+
+    algorithm = 'bcrypt'
+    rounds = int(getenv('BCRYPT_ROUNDS', '12'))
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password into a self-describing string
+        """
+        hashed = bcrypt.hashpw(pwd.encode(), bcrypt.gensalt(self.rounds))
+        # "$2b$<rounds>$" followed by 22 characters of salt and the hash
+        full = hashed.decode()
+        return "{}${}${}${}".format(self.algorithm, self.rounds,
+                                    full[7:29], full[29:])
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against a string produced by encode()
+        """
+        _, rounds, salt, digest = encoded.split('$')
+        full = "$2b${:02d}${}{}".format(int(rounds), salt, digest)
+        return bcrypt.checkpw(pwd.encode(), full.encode())
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Whether fewer rounds than configured were used
+        """
+        return int(encoded.split('$')[1]) < self.rounds
+
+
+class SHA256LegacyHasher(Hasher):
+    """ Unsalted SHA256 hex digests stored by earlier versions
+
+    Only used to verify existing passwords, which are then upgraded.
+    """
+
+    algorithm = 'sha256'
+
+    def encode(self, pwd: str) -> str:
+        """ Hash a password the legacy way
+        """
+        return hashlib.sha256(pwd.encode()).hexdigest().lower()
+
+    def verify(self, pwd: str, encoded: str) -> bool:
+        """ Check a password against a legacy digest
+        """
+        return hmac.compare_digest(self.encode(pwd), encoded)
+
+    def needs_update(self, encoded: str) -> bool:
+        """ Legacy digests always need an upgrade
+        """
+        return True
+
+
+def register_hasher(hasher: Hasher):
+    """ Make a hasher available under its algorithm name
+    """
+    HASHERS[hasher.algorithm] = hasher
+
+
+def identify_hasher(encoded: str) -> Hasher:
+    """ Find the hasher that produced a stored password
+    """
+    if '$' not in encoded:
+        return HASHERS[SHA256LegacyHasher.algorithm]
+    return HASHERS[encoded.split('$', 1)[0]]
+
+
+def make_password(pwd: str, algorithm: str = None) -> str:
+    """ Hash a password with the given or default algorithm
+    """
+    return HASHERS[algorithm or DEFAULT_HASHER].encode(pwd)
+
+
+def check_password(pwd: str, encoded: str) -> Tuple[bool, bool]:
+    """ Check a password against a stored one
+
+    Returns whether it matches, and whether the stored password should
+    be rehashed with the default algorithm and parameters.
+    """
+    try:
+        hasher = identify_hasher(encoded)
+        valid = hasher.verify(pwd, encoded)
+    except (KeyError, ValueError):
+        return False, False
+    if not valid:
+        return False, False
+    return True, (hasher.algorithm != DEFAULT_HASHER
+                  or hasher.needs_update(encoded))
+
+
+register_hasher(PBKDF2Hasher())
+register_hasher(ScryptHasher())
+register_hasher(SHA256LegacyHasher())
+if bcrypt is not None:
+    register_hasher(BCryptHasher())
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 """ User module
 """
-import hashlib
 from models.base import Base
+from models.hashers import check_password, make_password
 
 
 class User(Base):
     """ User class
     """
 
+    __slots__ = ('email', '_password', 'first_name', 'last_name')
+
+    UNIQUE_ATTRIBUTES = ('email',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a User instance
         """
@@ -26,22 +30,35 @@ class User(Base):
 
     @password.setter
     def password(self, pwd: str):
-        """ Setter of a new password: encrypt in SHA256
+        """ Setter of a new password: hash with the default hasher
         """
         if pwd is None or type(pwd) is not str:
             self._password = None
         else:
-            self._password = hashlib.sha256(pwd.encode()).hexdigest().lower()
+            self._password = make_password(pwd)
 
     def is_valid_password(self, pwd: str) -> bool:
         """ Validate a password
+
+        A password stored with an outdated hasher (such as legacy
+        SHA256) or weaker parameters is rehashed and saved on success.
+        If that save fails, the old hash is kept and upgraded on a later
+        login.
         """
         if pwd is None or type(pwd) is not str:
             return False
         if self.password is None:
             return False
-        pwd_e = pwd.encode()
-        return hashlib.sha256(pwd_e).hexdigest().lower() == self.password
+        valid, needs_update = check_password(pwd, self.password)
+        if valid and needs_update:
+            previous = self._password
+            self.password = pwd
+            if self._is_stored():
+                try:
+                    self.save()
+                except (OSError, ValueError):
+                    self._password = previous
+        return valid
 
     def display_name(self) -> str:
         """ Display User name based on email/first_name/last_name
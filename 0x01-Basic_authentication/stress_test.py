@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+""" Multi-threaded stress test of the users endpoints
+
+Runs random requests (create, read, list, page, update, delete, batch
+create, streamed list) from several threads at once against the Flask
+app, in a temporary directory, then checks that every request succeeded
+and that DATA, its indexes and the file on disk agree.
+
+Usage: ./stress_test.py [-t THREADS] [-n OPERATIONS] [-m file|log] [--lazy]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+
+def parse_args() -> argparse.Namespace:
+    """ Command line options
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-t', '--threads', type=int, default=16)
+    parser.add_argument('-n', '--operations', type=int, default=150,
+                        help="requests per thread")
+    parser.add_argument('-m', '--mode', choices=('file', 'log'),
+                        default='file', help="STORAGE_MODE")
+    parser.add_argument('--lazy', action='store_true',
+                        help="STORAGE_LAZY_LOAD=1")
+    parser.add_argument('-s', '--seed-users', type=int, default=2000)
+    return parser.parse_args()
+
+
+def worker(app, n: int, operations: int, errors: list):
+    """ Send random requests, recording unexpected answers in `errors`
+    """
+    client = app.test_client()
+    rnd = random.Random(n)
+    mine = []
+    for i in range(operations):
+        op = rnd.choice(('post', 'get', 'list', 'page', 'put', 'delete',
+                         'batch', 'stream'))
+        try:
+            if op == 'post':
+                r = client.post('/api/v1/users', json={
+                    'email': 't{}-{}@x'.format(n, i), 'password': 'pwd'})
+                assert r.status_code == 201, r.data
+                mine.append(r.get_json()['id'])
+            elif op == 'get' and mine:
+                r = client.get('/api/v1/users/' + rnd.choice(mine))
+                assert r.status_code == 200, r.data
+            elif op == 'list':
+                r = client.get('/api/v1/users?fields=id')
+                assert r.status_code == 200, r.data
+            elif op == 'page':
+                r = client.get('/api/v1/users?limit=50')
+                assert r.status_code == 200, r.data
+            elif op == 'put' and mine:
+                r = client.put('/api/v1/users/' + rnd.choice(mine),
+                               json={'first_name': 'n{}'.format(i)})
+                assert r.status_code == 200, r.data
+            elif op == 'delete' and mine:
+                r = client.delete('/api/v1/users/' + mine.pop())
+                assert r.status_code == 200, r.data
+            elif op == 'batch':
+                r = client.post('/api/v1/users/batch', json=[
+                    {'email': 'b{}-{}-{}@x'.format(n, i, k),
+                     'password': 'pwd'} for k in range(5)])
+                assert r.status_code == 200, r.data
+                assert all(result['status'] == 201
+                           for result in r.get_json()['results']), r.data
+            elif op == 'stream':
+                r = client.get('/api/v1/users?stream=ndjson')
+                assert r.status_code == 200, r.data
+                for line in r.data.splitlines():
+                    json.loads(line)
+        except Exception as e:
+            errors.append("{}: {!r}".format(op, e))
+
+
+def main() -> int:
+    """ Run the stress test, returning the exit status
+    """
+    args = parse_args()
+    os.environ['STORAGE_MODE'] = args.mode
+    os.environ['STORAGE_LAZY_LOAD'] = '1' if args.lazy else '0'
+    os.environ.setdefault('AUTH_TYPE', 'none')
+    os.environ.setdefault('PBKDF2_ITERATIONS', '1000')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(tempfile.mkdtemp(prefix='stress_test.'))
+    # Switch threads often to make races likely
+    sys.setswitchinterval(1e-5)
+
+    from api.v1.app import app
+    from models.base import INDEXES, ORDER
+    from models.user import User
+
+    User.load_from_file()
+    with User.batch():
+        for i in range(args.seed_users):
+            user = User()
+            user.email = 'seed{}@x'.format(i)
+            user.password = 'pwd'
+            user.save()
+    User.load_from_file()
+
+    errors = []
+    threads = [threading.Thread(target=worker,
+                                args=(app, n, args.operations, errors))
+               for n in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    ids = sorted(user.id for user in User.all())
+    indexed = sorted(obj_id for ids_ in INDEXES['User']['email'].values()
+                     for obj_id in ids_)
+    ordered = sorted(key[1] for key in ORDER['User'])
+    User.load_from_file()
+    on_disk = sorted(user.id for user in User.all())
+    for name, other in (('email index', indexed), ('order', ordered),
+                        ('file', on_disk)):
+        if other != ids:
+            errors.append("{} doesn't match DATA".format(name))
+
+    print("{} threads x {} requests in {:.1f}s, {} users, {} errors".format(
+        args.threads, args.operations, elapsed, len(ids), len(errors)))
+    for error in errors[:20]:
+        print(error)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
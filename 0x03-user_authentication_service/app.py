@@ -5,12 +5,31 @@
 from flask import Flask, jsonify, request, abort, redirect
 
 from auth import Auth
+from hash_pool import PoolSaturated
 
 
 app = Flask(__name__)
 AUTH = Auth()
 
 
+@app.teardown_appcontext
+def release_db_session(exception=None) -> None:
+    """Release the request's database session once it is handled."""
+    AUTH.release_db_session()
+
+
+@app.errorhandler(PoolSaturated)
+def hash_pool_saturated(error) -> str:
+    """Reject the request while password hashing is saturated.
+
+    Returns:
+        str: JSON error message with a 503 status.
+    """
+    response = jsonify({"message": "service busy, retry later"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
+
 @app.route("/", methods=["GET"], strict_slashes=False)
 def home() -> str:
     """Home page route.
@@ -3,25 +3,98 @@
 
 
 import bcrypt
+import math
+import time
+from os import getenv
 from uuid import uuid4
 from typing import Union
 
 from sqlalchemy.orm.exc import NoResultFound
 
 from db import DB
+from hash_pool import HashPool, PoolSaturated
+from session_store import MemorySessionStore
 from user import User
 
 
-def _hash_password(password: str) -> bytes:
+def _hash_password(password: str, rounds: int = 12) -> bytes:
     """Hash a password using bcrypt.
 
     Args:
         password (str): The password to hash.
+        rounds (int): The bcrypt work factor.
 
     Returns:
         bytes: The hashed password.
     """
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds))
+
+
+def _check_password(password: str, hashed_password: bytes) -> bool:
+    """Check a password against a bcrypt hash.
+
+    Args:
+        password (str): The password to check.
+        hashed_password (bytes): The stored hash.
+
+    Returns:
+        bool: True if the password matches the hash, False otherwise.
+    """
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password)
+
+
+def _hash_rounds(hashed_password: Union[bytes, str]) -> int:
+    """Read the work factor of a bcrypt hash.
+
+    Args:
+        hashed_password (Union[bytes, str]): A hash like "$2b$12$...",
+            whose work factor is always written with two digits.
+
+    Returns:
+        int: The work factor the hash was computed with.
+    """
+    return int(hashed_password[4:6])
+
+
+def _calibrate_rounds(target_seconds: float, min_rounds: int = 4,
+                      max_rounds: int = 16) -> int:
+    """Estimate the work factor whose check takes `target_seconds`.
+
+    One check is timed at a probe factor; the time doubles with each
+    round above it, so the factor fitting the target is extrapolated.
+
+    Args:
+        target_seconds (float): The acceptable check latency.
+        min_rounds (int): The lowest work factor returned.
+        max_rounds (int): The highest work factor returned.
+
+    Returns:
+        int: The calibrated work factor.
+    """
+    probe = max(min_rounds, min(8, max_rounds))
+    password = b"calibration password"
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(probe))
+    start = time.perf_counter()
+    bcrypt.checkpw(password, hashed)
+    elapsed = max(time.perf_counter() - start, 1e-6)
+    rounds = probe + math.floor(math.log2(target_seconds / elapsed))
+    return max(min_rounds, min(rounds, max_rounds))
+
+
+def _configured_rounds() -> int:
+    """Read the bcrypt work factor from the environment.
+
+    AUTH_BCRYPT_ROUNDS is either a work factor (default: 12) or "auto",
+    which calibrates it against AUTH_BCRYPT_TARGET_MS (default: 250).
+
+    Returns:
+        int: The work factor of new hashes.
+    """
+    rounds = getenv("AUTH_BCRYPT_ROUNDS", "12")
+    if rounds == "auto":
+        target_ms = float(getenv("AUTH_BCRYPT_TARGET_MS", "250"))
+        return _calibrate_rounds(target_ms / 1000)
+    return int(rounds)
 
 
 def _generate_uuid() -> str:
@@ -36,13 +109,39 @@ def _generate_uuid() -> str:
 class Auth:
     """Provides methods for user authentication and session management.
 
+    Password hashing and checking run in a HashPool, so they don't hold
+    up request threads; they raise PoolSaturated when it is full.
+    Sessions are cached in a session store in front of the database.
+    Hashes below the configured work factor are upgraded on login.
+
     Attributes:
         _db (DB): An instance of the DB class for database operations.
+        _hash_pool (HashPool): The pool running bcrypt computations.
+        _sessions (SessionStore): The cache of live sessions.
+        _rounds (int): The bcrypt work factor of new hashes.
     """
 
     def __init__(self):
         """Initialize a new Auth instance."""
         self._db = DB()
+        self._hash_pool = HashPool()
+        # Fork the workers before the app starts its request threads
+        self._hash_pool.start()
+        self._sessions = MemorySessionStore(on_expire=self._expire_session,
+                                            on_evict=self._record_last_use)
+        self._rounds = _configured_rounds()
+
+    def hash_metrics(self) -> dict:
+        """Report the queue depth and latency of password hashing.
+
+        Returns:
+            dict: The metrics of the hashing pool.
+        """
+        return self._hash_pool.metrics()
+
+    def release_db_session(self) -> None:
+        """Release the database session of the current thread."""
+        self._db.remove_session()
 
     def register_user(self, email: str, password: str) -> User:
         """Register a new user.
@@ -61,11 +160,16 @@ class Auth:
             self._db.find_user_by(email=email)
             raise ValueError(f"User {email} already exists")
         except NoResultFound:
-            return self._db.add_user(email, _hash_password(password))
+            hashed_password = self._hash_pool.run(_hash_password, password,
+                                                  self._rounds)
+            return self._db.add_user(email, hashed_password)
 
     def valid_login(self, email: str, password: str) -> bool:
         """Validate user login credentials.
 
+        A matching password whose hash is below the configured work
+        factor is rehashed, unless the hashing pool is saturated.
+
         Args:
             email (str): The user's email address.
             password (str): The user's password.
@@ -75,10 +179,25 @@ class Auth:
         """
         try:
             user = self._db.find_user_by(email=email)
-            return bcrypt.checkpw(password.encode("utf-8"),
-                                  user.hashed_password)
         except NoResultFound:
             return False
+        # Read once: the user is expired, and reloaded, by any commit
+        hashed_password = user.hashed_password
+        if not self._hash_pool.run(_check_password, password,
+                                   hashed_password):
+            return False
+        if _hash_rounds(hashed_password) < self._rounds:
+            try:
+                new_password_hash = self._hash_pool.run(
+                    _hash_password, password, self._rounds)
+            except PoolSaturated:
+                return True
+            # Only replace the hash that was checked, not one set by a
+            # password reset meanwhile
+            self._db.update_user_by(
+                {"id": user.id, "hashed_password": hashed_password},
+                hashed_password=new_password_hash)
+        return True
 
     def create_session(self, email: str) -> Union[str, None]:
         """Create a new session for a user.
@@ -89,31 +208,62 @@ class Auth:
         Returns:
             Union[str, None]: The session ID if successful, None otherwise.
         """
-        try:
-            user = self._db.find_user_by(email=email)
-            session_id = _generate_uuid()
-            self._db.update_user(user.id, session_id=session_id)
-            return session_id
-        except NoResultFound:
+        session_id = _generate_uuid()
+        created = time.time()
+        row = self._db.update_user_returning(
+            {"email": email}, ("id", "email"),
+            session_id=session_id, session_created_at=created,
+            session_seen_at=created)
+        if row is None:
             return None
+        self._sessions.set(session_id, User(id=row[0], email=row[1]),
+                           created)
+        return session_id
 
     def get_user_from_session_id(
         self, session_id: str
     ) -> Union[User, None]:
         """Retrieve a user based on their session ID.
 
+        Cached sessions are served from the session store; others are
+        looked up in the database, ended if older than the absolute
+        expiry or unused for longer than the idle expiry, and cached
+        otherwise. The last use stored with a session is only updated when
+        the session is loaded or evicted from the store, so after a
+        restart a session can end early, but never late.
+
         Args:
             session_id (str): The user's session ID.
 
         Returns:
-            Union[User, None]: The User object if found, None otherwise.
+            Union[User, None]: A User object carrying the user's id and
+            email if found, None otherwise.
         """
         if session_id is None:
             return None
+        user = self._sessions.get(session_id)
+        if user is not None:
+            return user
         try:
-            return self._db.find_user_by(session_id=session_id)
+            found = self._db.find_user_by(session_id=session_id)
         except NoResultFound:
             return None
+        now = time.time()
+        # Sessions created before these times were recorded start now
+        created = found.session_created_at or now
+        seen = found.session_seen_at or created
+        absolute_ttl = self._sessions.absolute_ttl
+        idle_ttl = self._sessions.idle_ttl
+        if (absolute_ttl > 0 and now - created >= absolute_ttl or
+                idle_ttl > 0 and now - seen >= idle_ttl):
+            self._expire_session(session_id)
+            return None
+        user = User(id=found.id, email=found.email)
+        self._db.update_user_by({"session_id": session_id},
+                                session_created_at=created,
+                                session_seen_at=now)
+        self._sessions.set(session_id, user, created)
+        return user
 
     def destroy_session(self, user_id: int) -> None:
         """Destroy a user's session.
@@ -122,7 +272,31 @@ class Auth:
             user_id (int): The ID of the user.
         """
         if user_id is not None:
-            self._db.update_user(user_id, session_id=None)
+            self._db.update_user(user_id, session_id=None,
+                                 session_created_at=None,
+                                 session_seen_at=None)
+            self._sessions.revoke(user_id=user_id)
+
+    def _expire_session(self, session_id: str) -> None:
+        """End a session that expired in the session store.
+
+        Args:
+            session_id (str): The expired session ID.
+        """
+        self._db.update_user_by({"session_id": session_id}, session_id=None,
+                                session_created_at=None,
+                                session_seen_at=None)
+
+    def _record_last_use(self, session_id: str, seen: float) -> None:
+        """Store the last use of a session evicted from the session store.
+
+        Args:
+            session_id (str): The evicted session ID.
+            seen (float): When the session was last used, in seconds
+                since the epoch.
+        """
+        self._db.update_user_by({"session_id": session_id},
+                                session_seen_at=seen)
 
     def get_reset_password_token(self, email: str) -> str:
         """Generate a password reset token for a user.
@@ -136,17 +310,18 @@ class Auth:
         Raises:
             ValueError: If no user with the given email exists.
         """
-        try:
-            user = self._db.find_user_by(email=email)
-            reset_token = _generate_uuid()
-            self._db.update_user(user.id, reset_token=reset_token)
-            return reset_token
-        except NoResultFound:
+        reset_token = _generate_uuid()
+        if self._db.update_user_by({"email": email},
+                                   reset_token=reset_token) == 0:
             raise ValueError()
+        return reset_token
 
     def update_password(self, reset_token: str, password: str) -> None:
         """Update a user's password.
 
+        The token is looked up before the new password is hashed, so an
+        unknown token doesn't cost a hash.
+
         Args:
             reset_token (str): The password reset token.
             password (str): The new password.
@@ -154,11 +329,16 @@ class Auth:
         Raises:
             ValueError: If the reset token is invalid.
         """
+        if reset_token is None:
+            raise ValueError()
         try:
-            user = self._db.find_user_by(reset_token=reset_token)
-            new_password_hash = _hash_password(password)
-            self._db.update_user(
-                user.id, hashed_password=new_password_hash, reset_token=None
-            )
+            self._db.find_user_by(reset_token=reset_token)
         except NoResultFound:
             raise ValueError()
+        new_password_hash = self._hash_pool.run(_hash_password, password,
+                                                self._rounds)
+        if self._db.update_user_by(
+            {"reset_token": reset_token},
+            hashed_password=new_password_hash, reset_token=None
+        ) == 0:
+            raise ValueError()
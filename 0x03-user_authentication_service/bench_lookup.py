@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Benchmarks session_id lookups with and without their index.
+
+Fills an in-memory SQLite database with users at each size, then times
+random DB.find_user_by(session_id=...) calls, first with the index and
+again after dropping it.
+
+Usage: ./bench_lookup.py [-n USERS ...] [-q QUERIES]
+"""
+
+
+import argparse
+import random
+import time
+from uuid import uuid4
+
+from sqlalchemy import text
+
+from db import DB
+from user import User
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse the command line arguments.
+
+    Returns:
+        argparse.Namespace: The benchmark parameters.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark indexed and unindexed session lookups")
+    parser.add_argument("-n", "--users", type=int, nargs="+",
+                        default=[10000, 100000, 1000000],
+                        help="user counts to compare")
+    parser.add_argument("-q", "--queries", type=int, default=200,
+                        help="lookups timed per run")
+    return parser.parse_args()
+
+
+def fill(db: DB, count: int, chunk_size: int = 10000) -> list:
+    """Insert users with a session each.
+
+    Args:
+        db (DB): The database to fill.
+        count (int): The number of users.
+        chunk_size (int): The number of users inserted per statement.
+
+    Returns:
+        list: The session IDs of the users.
+    """
+    session_ids = [str(uuid4()) for _ in range(count)]
+    with db._engine.begin() as connection:
+        for start in range(0, count, chunk_size):
+            connection.execute(User.__table__.insert(), [
+                {"email": f"user{i}@example.com", "hashed_password": "x",
+                 "session_id": session_ids[i]}
+                for i in range(start, min(start + chunk_size, count))
+            ])
+    return session_ids
+
+
+def time_lookups(db: DB, session_ids: list) -> float:
+    """Time one lookup per session ID.
+
+    Args:
+        db (DB): The database to query.
+        session_ids (list): The session IDs to look up.
+
+    Returns:
+        float: The mean lookup time in seconds.
+    """
+    start = time.perf_counter()
+    for session_id in session_ids:
+        db.find_user_by(session_id=session_id)
+        db.remove_session()
+    return (time.perf_counter() - start) / len(session_ids)
+
+
+def main() -> None:
+    """Run the benchmark and print one line per user count."""
+    args = parse_args()
+    print(f"{'users':>9} {'indexed':>12} {'scan':>12}")
+    for count in args.users:
+        db = DB(url="sqlite://", reset=True)
+        session_ids = fill(db, count)
+        sample = random.sample(session_ids, min(args.queries, count))
+        indexed = time_lookups(db, sample)
+        with db._engine.begin() as connection:
+            connection.execute(text("DROP INDEX ix_users_session_id"))
+        scan = time_lookups(db, sample)
+        print(f"{count:>9} {indexed * 1e6:>9.1f} us {scan * 1e6:>9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
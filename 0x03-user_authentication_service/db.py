@@ -2,42 +2,150 @@
 """Database interaction module."""
 
 
-from sqlalchemy import create_engine, tuple_
+from os import getenv
+from typing import Union
+
+from sqlalchemy import create_engine, event, inspect, text, tuple_
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.session import Session
+from sqlalchemy.pool import QueuePool, StaticPool
 
 from user import Base, User
 
 
+def _create_engine(url: str, pool_size: int,
+                   journal_mode: str, busy_timeout: int) -> Engine:
+    """Create a pooled SQLAlchemy engine.
+
+    SQLite connections are shared across threads through the pool, wait
+    up to `busy_timeout` milliseconds on a locked database and use the
+    given journal mode. In-memory SQLite databases use a single shared
+    connection, since each connection would otherwise see its own empty
+    database.
+
+    Args:
+        url (str): The database URL.
+        pool_size (int): The number of connections kept in the pool.
+        journal_mode (str): The SQLite journal mode, e.g. "WAL".
+        busy_timeout (int): The SQLite busy timeout in milliseconds.
+
+    Returns:
+        Engine: The configured engine.
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(url, echo=False, pool_size=pool_size)
+
+    options = {"connect_args": {"check_same_thread": False}}
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        options["poolclass"] = StaticPool
+    else:
+        options["poolclass"] = QueuePool
+        options["pool_size"] = pool_size
+    engine = create_engine(url, echo=False, **options)
+
+    @event.listens_for(engine, "connect")
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA busy_timeout = {int(busy_timeout)}")
+        if journal_mode:
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        cursor.close()
+
+    return engine
+
+
 class DB:
     """Provides an interface for interacting with the database.
 
+    Each thread gets its own session from a scoped registry, backed by a
+    pooled engine. The database is configured through the AUTH_DB_URL,
+    AUTH_DB_POOL_SIZE, AUTH_DB_JOURNAL_MODE, AUTH_DB_BUSY_TIMEOUT and
+    AUTH_DB_RESET environment variables unless given explicitly.
+
     Attributes:
         _engine (Engine): SQLAlchemy engine for database connectivity.
         _session (Session): SQLAlchemy session for database operations.
     """
 
-    def __init__(self) -> None:
-        """Initialize a new DB instance."""
-        self._engine = create_engine("sqlite:///a.db", echo=False)
-        Base.metadata.drop_all(self._engine)
+    def __init__(self, url: str = None, pool_size: int = None,
+                 journal_mode: str = None, busy_timeout: int = None,
+                 reset: bool = None) -> None:
+        """Initialize a new DB instance.
+
+        Args:
+            url (str): The database URL (default: "sqlite:///a.db").
+            pool_size (int): The connection pool size (default: 5).
+            journal_mode (str): The SQLite journal mode (default: "WAL").
+            busy_timeout (int): The SQLite busy timeout in milliseconds
+                (default: 5000).
+            reset (bool): Whether to drop existing tables (default: True).
+                When False, existing data is kept and the schema is
+                upgraded in place.
+        """
+        if url is None:
+            url = getenv("AUTH_DB_URL", "sqlite:///a.db")
+        if pool_size is None:
+            pool_size = int(getenv("AUTH_DB_POOL_SIZE", "5"))
+        if journal_mode is None:
+            journal_mode = getenv("AUTH_DB_JOURNAL_MODE", "WAL")
+        if busy_timeout is None:
+            busy_timeout = int(getenv("AUTH_DB_BUSY_TIMEOUT", "5000"))
+        if reset is None:
+            reset = getenv("AUTH_DB_RESET", "1") not in ("0", "false", "no")
+        self._engine = _create_engine(url, pool_size,
+                                      journal_mode, busy_timeout)
+        if reset:
+            Base.metadata.drop_all(self._engine)
         Base.metadata.create_all(self._engine)
-        self.__session = None
+        self.upgrade_schema()
+        self.__session = scoped_session(sessionmaker(bind=self._engine))
 
     @property
     def _session(self) -> Session:
-        """Provide a SQLAlchemy session object.
+        """Provide the SQLAlchemy session of the current thread.
 
         Returns:
             Session: SQLAlchemy session for database operations.
         """
-        if self.__session is None:
-            DBSession = sessionmaker(bind=self._engine)
-            self.__session = DBSession()
-        return self.__session
+        return self.__session()
+
+    def upgrade_schema(self) -> None:
+        """Create the columns and indexes missing from existing tables.
+
+        `create_all` skips tables that already exist, so databases
+        created before a column or an index was declared are upgraded
+        here without touching their rows. Added columns must be nullable.
+
+        Raises:
+            IntegrityError: If existing rows violate a unique index.
+        """
+        inspector = inspect(self._engine)
+        dialect = self._engine.dialect
+        for table in Base.metadata.sorted_tables:
+            columns = {column["name"]
+                       for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    with self._engine.begin() as connection:
+                        connection.execute(text(
+                            "ALTER TABLE {} ADD COLUMN {} {}".format(
+                                table.name, column.name,
+                                column.type.compile(dialect=dialect))))
+            existing = {index["name"]
+                        for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(bind=self._engine)
+
+    def remove_session(self) -> None:
+        """Close the session of the current thread and release its
+        connection back to the pool.
+        """
+        self.__session.remove()
 
     def add_user(self, email: str, hashed_password: str) -> User:
         """Add a new user to the database.
@@ -71,15 +179,8 @@ class DB:
             InvalidRequestError: If an invalid filter key is provided.
             NoResultFound: If no user matches the filters.
         """
-        fields, values = [], []
-        for key, value in kwargs.items():
-            if hasattr(User, key):
-                fields.append(getattr(User, key))
-                values.append(value)
-            else:
-                raise InvalidRequestError()
         result = self._session.query(User).filter(
-            tuple_(*fields).in_([tuple(values)])
+            self._criterion(kwargs)
         ).first()
         if result is None:
             raise NoResultFound()
@@ -94,18 +195,110 @@ class DB:
 
         Raises:
             ValueError: If an invalid field key is provided.
+            NoResultFound: If no user has the given ID.
+        """
+        if self.update_user_by({"id": user_id}, **kwargs) == 0:
+            raise NoResultFound()
+
+    def update_user_by(self, filters: dict, **kwargs) -> int:
+        """Update the users matching filters in a single statement.
+
+        Args:
+            filters (dict): The column values selecting the users.
+            **kwargs: Keyword arguments representing the fields to update.
+
+        Returns:
+            int: The number of updated users.
+
+        Raises:
+            InvalidRequestError: If an invalid filter key is provided.
+            ValueError: If an invalid field key is provided.
         """
-        user = self.find_user_by(id=user_id)
-        if user is None:
-            return
         update_source = {}
         for key, value in kwargs.items():
             if hasattr(User, key):
                 update_source[getattr(User, key)] = value
             else:
                 raise ValueError()
-        self._session.query(User).filter(User.id == user_id).update(
-            update_source,
-            synchronize_session=False,
-        )
-        self._session.commit()
+        try:
+            count = self._session.query(User).filter(
+                self._criterion(filters)
+            ).update(update_source, synchronize_session=False)
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+        return count
+
+    def update_user_returning(self, filters: dict, columns: tuple,
+                              **kwargs) -> Union[tuple, None]:
+        """Update the user matching filters and read back some of its
+        columns, in a single transaction.
+
+        Args:
+            filters (dict): The column values selecting the user.
+            columns (tuple): The names of the columns to read back.
+            **kwargs: Keyword arguments representing the fields to update.
+
+        Returns:
+            Union[tuple, None]: The values of `columns` after the update,
+            or None if no user matched.
+
+        Raises:
+            InvalidRequestError: If an invalid filter or column key is
+                provided.
+            ValueError: If an invalid field key is provided.
+        """
+        update_source = {}
+        for key, value in kwargs.items():
+            if hasattr(User, key):
+                update_source[getattr(User, key)] = value
+            else:
+                raise ValueError()
+        selected = []
+        for key in columns:
+            if not hasattr(User, key):
+                raise InvalidRequestError()
+            selected.append(getattr(User, key))
+        # Updated filter columns are read back by their new values
+        updated = {key: kwargs.get(key, value)
+                   for key, value in filters.items()}
+        try:
+            count = self._session.query(User).filter(
+                self._criterion(filters)
+            ).update(update_source, synchronize_session=False)
+            row = None
+            if count > 0:
+                row = self._session.query(*selected).filter(
+                    self._criterion(updated)
+                ).first()
+            self._session.commit()
+        except Exception:
+            self._session.rollback()
+            raise
+        return tuple(row) if row is not None else None
+
+    @staticmethod
+    def _criterion(filters: dict):
+        """Build the WHERE criterion matching all filters.
+
+        Values are compared with IN rather than `==`, so a None filter
+        never matches (it would otherwise become `IS NULL`).
+
+        Args:
+            filters (dict): The column values to match.
+
+        Returns:
+            The SQLAlchemy criterion.
+
+        Raises:
+            InvalidRequestError: If an invalid filter key is provided.
+        """
+        fields, values = [], []
+        for key, value in filters.items():
+            if hasattr(User, key):
+                fields.append(getattr(User, key))
+                values.append(value)
+            else:
+                raise InvalidRequestError()
+        return tuple_(*fields).in_([tuple(values)])
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""A bounded process pool for CPU-heavy password hashing."""
+
+
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from os import getenv
+from typing import Any, Callable
+
+
+class PoolSaturated(Exception):
+    """Raised when no pool slot frees up within the queue timeout."""
+
+
+class HashPool:
+    """Runs password hashing functions in worker processes.
+
+    At most `workers + queue_size` calls are in flight at once; callers
+    beyond that wait up to `queue_timeout` seconds for a slot and then
+    get PoolSaturated, so a burst of logins can't pile up unbounded work
+    or stall the request threads serving other routes. With zero workers,
+    functions run inline in the calling thread.
+
+    Forking a multi-threaded process can deadlock the child, so `start`
+    should be called while the process has a single thread, before any
+    request is served; the pool is otherwise started on first use.
+
+    Attributes:
+        workers (int): The number of worker processes.
+        queue_size (int): The number of calls allowed to wait for a worker.
+        queue_timeout (float): The seconds a caller waits for a free slot.
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = None,
+                 queue_timeout: float = None) -> None:
+        """Initialize a new HashPool.
+
+        Args:
+            workers (int): The number of worker processes (default:
+                AUTH_HASH_WORKERS, or the number of CPUs).
+            queue_size (int): The number of waiting calls (default:
+                AUTH_HASH_QUEUE_SIZE, or 4 per worker).
+            queue_timeout (float): The seconds to wait for a slot
+                (default: AUTH_HASH_QUEUE_TIMEOUT, or 0.5).
+        """
+        if workers is None:
+            workers = int(getenv("AUTH_HASH_WORKERS", os.cpu_count() or 1))
+        if queue_size is None:
+            queue_size = int(getenv("AUTH_HASH_QUEUE_SIZE", 4 * workers))
+        if queue_timeout is None:
+            queue_timeout = float(getenv("AUTH_HASH_QUEUE_TIMEOUT", "0.5"))
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max(workers, 1) + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def run(self, fn: Callable, *args) -> Any:
+        """Run a function in the pool and wait for its result.
+
+        Args:
+            fn (Callable): A module-level (picklable) function.
+            *args: The arguments to call it with.
+
+        Returns:
+            Any: The function's result.
+
+        Raises:
+            PoolSaturated: If every slot stays busy for `queue_timeout`.
+        """
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._rejected += 1
+            raise PoolSaturated()
+        start = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            return self._get_executor().submit(fn, *args).result()
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._latency_total += elapsed
+                self._latency_max = max(self._latency_max, elapsed)
+            self._slots.release()
+
+    def start(self) -> None:
+        """Start the worker processes now.
+
+        Workers are forked when the first call is submitted, so a no-op
+        call is run to fork all of them from the calling thread.
+        """
+        if self.workers > 0:
+            self._get_executor().submit(os.getpid).result()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Start the worker processes on first use.
+
+        Returns:
+            ProcessPoolExecutor: The executor running the calls.
+        """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(self.workers)
+        return self._executor
+
+    def metrics(self) -> dict:
+        """Report the pool's queue depth and latency.
+
+        Returns:
+            dict: The number of calls in flight and waiting, completed and
+            rejected calls, and the mean and max latency in milliseconds.
+        """
+        with self._lock:
+            completed = self._completed
+            mean = self._latency_total / completed if completed else 0.0
+            return {
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "queue_depth": max(self._in_flight - self.workers, 0),
+                "completed": completed,
+                "rejected": self._rejected,
+                "latency_mean_ms": mean * 1000,
+                "latency_max_ms": self._latency_max * 1000,
+            }
+
+    def shutdown(self) -> None:
+        """Stop the worker processes."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
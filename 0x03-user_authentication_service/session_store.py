@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""Session stores caching the user of each session id."""
+
+
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from os import getenv
+from typing import Callable, Union
+
+from user import User
+
+
+class SessionStore:
+    """Interface of a session store.
+
+    A store only caches sessions: the `users` table stays the source of
+    truth, and a session missing from the store is looked up there.
+    """
+
+    def get(self, session_id: str) -> Union[User, None]:
+        """Retrieve the user of a session.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            Union[User, None]: The user if the session is cached and
+            alive, None otherwise.
+        """
+        raise NotImplementedError()
+
+    def set(self, session_id: str, user: User,
+            created: float = None) -> None:
+        """Cache a session, replacing any other session of the user.
+
+        Args:
+            session_id (str): The session ID.
+            user (User): The user owning the session.
+            created (float): When the session was created, in seconds
+                since the epoch (default: now).
+        """
+        raise NotImplementedError()
+
+    def revoke(self, user_id: int = None, email: str = None) -> None:
+        """Drop the cached session of a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            email (str): The email of the user.
+        """
+        raise NotImplementedError()
+
+
+class MemorySessionStore(SessionStore):
+    """In-process session store with idle and absolute expiry.
+
+    Sessions live in an LRU-ordered dict capped at `max_size`, and a heap
+    of deadlines lets expired sessions be purged without scanning. An
+    expired session is reported to `on_expire` so it can be ended in the
+    database too; a session evicted by the size cap is only forgotten.
+
+    The absolute expiry counts from the session's creation time, as given
+    to `set`, so re-caching a session doesn't extend it. The idle expiry
+    counts from the last use seen by this store; when a session is evicted
+    by the size cap, its last use is passed to `on_evict` so it can be
+    stored with the session.
+
+    Attributes:
+        max_size (int): The maximum number of cached sessions.
+        idle_ttl (float): The seconds a session lives without being used,
+            0 for no limit.
+        absolute_ttl (float): The seconds a session lives after being
+            created, 0 for no limit.
+    """
+
+    def __init__(self, max_size: int = None, idle_ttl: float = None,
+                 absolute_ttl: float = None,
+                 on_expire: Callable[[str], None] = None,
+                 on_evict: Callable[[str, float], None] = None) -> None:
+        """Initialize an empty store.
+
+        Args:
+            max_size (int): The maximum number of cached sessions
+                (default: SESSION_STORE_SIZE, or 10000).
+            idle_ttl (float): The idle expiry in seconds
+                (default: SESSION_IDLE_TTL, or 1800).
+            absolute_ttl (float): The absolute expiry in seconds
+                (default: SESSION_ABSOLUTE_TTL, or 86400).
+            on_expire (Callable[[str], None]): Called with the ID of
+                every expired session.
+            on_evict (Callable[[str, float], None]): Called with the ID
+                of every session evicted by the size cap and its last
+                use, in seconds since the epoch.
+        """
+        if max_size is None:
+            max_size = int(getenv("SESSION_STORE_SIZE", "10000"))
+        if idle_ttl is None:
+            idle_ttl = float(getenv("SESSION_IDLE_TTL", "1800"))
+        if absolute_ttl is None:
+            absolute_ttl = float(getenv("SESSION_ABSOLUTE_TTL", "86400"))
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.absolute_ttl = absolute_ttl
+        self._on_expire = on_expire
+        self._on_evict = on_evict
+        self._sessions = OrderedDict()
+        self._by_user_id = {}
+        self._by_email = {}
+        self._deadlines = []
+        self._lock = threading.Lock()
+
+    def _deadline(self, created: float, last_seen: float) -> float:
+        """Compute when a session expires.
+
+        Args:
+            created (float): When the session was cached.
+            last_seen (float): When the session was last used.
+
+        Returns:
+            float: The expiry time, infinite if the session never expires.
+        """
+        deadline = float("inf")
+        if self.idle_ttl > 0:
+            deadline = last_seen + self.idle_ttl
+        if self.absolute_ttl > 0:
+            deadline = min(deadline, created + self.absolute_ttl)
+        return deadline
+
+    def get(self, session_id: str) -> Union[User, None]:
+        """Retrieve the user of a session, refreshing its idle expiry.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            Union[User, None]: The user if the session is cached and
+            alive, None otherwise.
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = self._purge(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry[2] = now
+                self._sessions.move_to_end(session_id)
+        self._report(expired)
+        return entry[0] if entry is not None else None
+
+    def set(self, session_id: str, user: User,
+            created: float = None) -> None:
+        """Cache a session, replacing any other session of the user.
+
+        An already expired session is not cached.
+
+        Args:
+            session_id (str): The session ID.
+            user (User): The user owning the session.
+            created (float): When the session was created, in seconds
+                since the epoch (default: now).
+        """
+        if self.max_size <= 0:
+            return
+        now = time.monotonic()
+        started = now
+        if created is not None:
+            started = now - max(time.time() - created, 0.0)
+        deadline = self._deadline(started, now)
+        evicted = []
+        with self._lock:
+            self._drop(self._by_user_id.get(user.id))
+            self._drop(self._by_email.get(user.email))
+            self._drop(session_id)
+            if deadline <= now:
+                return
+            self._sessions[session_id] = [user, started, now]
+            self._by_user_id[user.id] = session_id
+            self._by_email[user.email] = session_id
+            if deadline != float("inf"):
+                heapq.heappush(self._deadlines, (deadline, session_id))
+            while len(self._sessions) > self.max_size:
+                oldest = next(iter(self._sessions))
+                evicted.append((oldest, self._sessions[oldest][2]))
+                self._drop(oldest)
+        if self._on_evict is not None:
+            wall_offset = time.time() - time.monotonic()
+            for evicted_id, last_seen in evicted:
+                self._on_evict(evicted_id, last_seen + wall_offset)
+
+    def revoke(self, user_id: int = None, email: str = None) -> None:
+        """Drop the cached session of a user.
+
+        Args:
+            user_id (int): The ID of the user.
+            email (str): The email of the user.
+        """
+        with self._lock:
+            if user_id is not None:
+                self._drop(self._by_user_id.get(user_id))
+            if email is not None:
+                self._drop(self._by_email.get(email))
+
+    def __len__(self) -> int:
+        """Return the number of cached sessions."""
+        return len(self._sessions)
+
+    def _drop(self, session_id: str) -> None:
+        """Forget a session. Must be called with the lock held.
+
+        Args:
+            session_id (str): The session ID, ignored if None or unknown.
+        """
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return
+        user = entry[0]
+        if self._by_user_id.get(user.id) == session_id:
+            del self._by_user_id[user.id]
+        if self._by_email.get(user.email) == session_id:
+            del self._by_email[user.email]
+
+    def _purge(self, now: float) -> list:
+        """Forget every expired session. Must be called with the lock held.
+
+        Heap deadlines are only lower bounds, since using a session
+        pushes its idle expiry back; such sessions are rescheduled.
+
+        Args:
+            now (float): The current monotonic time.
+
+        Returns:
+            list: The IDs of the expired sessions.
+        """
+        expired = []
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, session_id = heapq.heappop(self._deadlines)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                continue
+            deadline = self._deadline(entry[1], entry[2])
+            if deadline > now:
+                heapq.heappush(self._deadlines, (deadline, session_id))
+            else:
+                self._drop(session_id)
+                expired.append(session_id)
+        return expired
+
+    def _report(self, expired: list) -> None:
+        """Pass expired session IDs to the expiry callback.
+
+        Args:
+            expired (list): The IDs of the expired sessions.
+        """
+        if self._on_expire is not None:
+            for session_id in expired:
+                self._on_expire(session_id)
@@ -2,7 +2,7 @@
 """The `user` model's module."""
 
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Float, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 
 
@@ -12,17 +12,26 @@ Base = declarative_base()
 class User(Base):
     """Represents a user in the database.
 
+    `email`, `session_id` and `reset_token` are backed by unique indexes,
+    since every authentication lookup filters on one of them.
+
     Attributes:
         id (int): The user's unique ID.
         email (str): The user's email address.
         hashed_password (str): The user's hashed password.
         session_id (str): The user's session ID (if logged in).
+        session_created_at (float): When the session was created, in
+            seconds since the epoch (if logged in).
+        session_seen_at (float): When the session was last known to be
+            used, in seconds since the epoch (if logged in).
         reset_token (str): The user's password reset token (if requested).
     """
 
     __tablename__ = "users"
     id = Column(Integer, primary_key=True)
-    email = Column(String(250), nullable=False)
+    email = Column(String(250), nullable=False, unique=True, index=True)
     hashed_password = Column(String(250), nullable=False)
-    session_id = Column(String(250), nullable=True)
-    reset_token = Column(String(250), nullable=True)
+    session_id = Column(String(250), nullable=True, unique=True, index=True)
+    session_created_at = Column(Float, nullable=True)
+    session_seen_at = Column(Float, nullable=True)
+    reset_token = Column(String(250), nullable=True, unique=True, index=True)